@@ -0,0 +1,82 @@
+import datetime as dt
+
+import streamlit as st
+
+from lib.ticker import Ticker
+from lib.portfolio import Portfolio
+from app import dynamic_plots as plot
+
+
+# Tickers, portfolios and figures are shared across reruns and sessions, keyed on the ticker codes, years,
+# market, sims and seed. Results are evicted after CACHE_TTL or when a function holds more than CACHE_MAX_ENTRIES.
+CACHE_TTL = dt.timedelta(hours=1)
+CACHE_MAX_ENTRIES = 64
+
+# Simulations are seeded so reruns reuse the same cached results
+SIMULATION_SEED = 0
+
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def load_ticker(code: str, years: int, asx: bool) -> Ticker:
+    return Ticker(code=code, years=years, asx=asx)
+
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def load_portfolio(holdings: tuple[tuple[str, int], ...], years: int, asx: bool) -> Portfolio:
+    """Load a portfolio from a tuple of (code, units) pairs"""
+    return Portfolio(holdings=dict(holdings), years=years, asx=asx)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def get_company_name(code: str, years: int, asx: bool):
+    return load_ticker(code, years, asx).get_company_name()
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ticker_fit_figure(code: str, years: int, asx: bool):
+    return plot.plot_returns_fit(load_ticker(code, years, asx))
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ticker_log_returns_figure(code: str, years: int, asx: bool):
+    ticker = load_ticker(code, years, asx)
+    return plot.plot_log_returns(ticker, start_date=ticker.start_date)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ticker_autocorrelation_figure(code: str, years: int, asx: bool, max_lag: int):
+    return plot.plot_ticker_autocorrelation(load_ticker(code, years, asx), max_lag=max_lag)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def ticker_simulation_figure(
+    code: str, years: int, asx: bool, forecast_days: int, sims=1000, seed=SIMULATION_SEED
+):
+    ticker = load_ticker(code, years, asx)
+    return plot.plot_simulated_balance(
+        ticker, ticker.start_date, forecast_days, sims=sims, seed=seed
+    )
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def portfolio_corr_heatmap(
+    holdings: tuple[tuple[str, int], ...], years: int, asx: bool, _portfolio=None
+):
+    """Pass the portfolio for these holdings as _portfolio to avoid loading it again"""
+    portfolio = load_portfolio(holdings, years, asx) if _portfolio is None else _portfolio
+    return plot.plot_portfolio_corr_heatmap(portfolio)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def portfolio_optimization_figure(
+    holdings: tuple[tuple[str, int], ...],
+    years: int,
+    asx: bool,
+    method: str,
+    sims=25_000,
+    seed=SIMULATION_SEED,
+    _portfolio=None,
+):
+    """Pass the portfolio for these holdings as _portfolio to avoid loading it again"""
+    portfolio = load_portfolio(holdings, years, asx) if _portfolio is None else _portfolio
+    return plot.plot_portfolio_optimization(portfolio, sims=sims, method=method, seed=seed)
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+# Default number of points sent to the browser per line
+MAX_POINTS = 2000
+
+
+def _to_numeric(x) -> np.ndarray:
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb_indices(x, y, max_points=MAX_POINTS) -> np.ndarray:
+    """
+    Indices of a shape preserving subset of at most max_points points (Largest Triangle Three Buckets).
+
+    Keeps the first and last points and, for each bucket in between, the point forming the largest triangle
+    with the previously kept point and the average of the next bucket, so peaks and troughs survive.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = _to_numeric(x)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.intp)
+    indices = np.empty(max_points, dtype=np.intp)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        indices[i + 1] = previous
+
+    return indices
+
+
+def downsample(x, y, max_points=MAX_POINTS) -> tuple[np.ndarray, np.ndarray]:
+    """Downsample a line to at most max_points points with LTTB"""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    indices = lttb_indices(x, y, max_points)
+    return x[indices], y[indices]
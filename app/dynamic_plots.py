@@ -5,9 +5,11 @@ import numpy as np
 
 from lib.ticker import Ticker
 from lib.portfolio import Portfolio
-from lib.utils import fitting as fit, helper as help, time
+from lib.utils import fitting as fit, helper as help, time, tracing
+from app import downsample
 
 
+@tracing.traced()
 def plot_returns_fit(ticker: Ticker):
     """
     Returns the fitted T distribution of the ticker along with its log return data.
@@ -49,14 +51,21 @@ def plot_returns_fit(ticker: Ticker):
     return fig
 
 
-def plot_log_returns(ticker: Ticker, start_date: dt.datetime):
+def _band_polygon(x: np.ndarray, low: np.ndarray, high: np.ndarray):
+    """x and y arrays tracing a closed polygon between two band lines, for a fill="toself" trace"""
+    return np.concatenate([x, x[::-1]]), np.concatenate([low, high[::-1]])
+
+
+@tracing.traced()
+def plot_log_returns(
+    ticker: Ticker, start_date: dt.datetime, max_points=downsample.MAX_POINTS
+):
     data = ticker.get_log_returns()
+    x, y = downsample.downsample(data.index.values, data.values, max_points)
     fig = go.Figure()
 
     fig.add_trace(
-        go.Scatter(
-            x=data.index, y=data.values, mode="lines", line=dict(color="dodgerblue")
-        )
+        go.Scatter(x=x, y=y, mode="lines", line=dict(color="dodgerblue"))
     )
 
     fig.update_layout(
@@ -66,27 +75,41 @@ def plot_log_returns(ticker: Ticker, start_date: dt.datetime):
     return fig
 
 
+@tracing.traced()
 def plot_simulated_balance(
     ticker: Ticker,
     start_date: dt.datetime,
     forecast_days: int,
     starting_balance=None,
     sims=1000,
+    seed=None,
+    max_points=downsample.MAX_POINTS,
 ):
     if starting_balance is None:
         starting_balance = ticker.get_current_price()
 
-    historic_data = ticker.df["Close"][ticker.df.index >= start_date]
+    historic_data = ticker.get_close_prices()
+    historic_data = historic_data[historic_data.index >= start_date]
 
     # Simulate the future data
-    simdata = ticker.simulate_returns(forecast_days, starting_balance, sims=sims)
-    low, mid, high = help.calculate_percentiles(simdata, confidence=95, axis=0)
-    bq, _, uq = help.calculate_percentiles(simdata, confidence=50, axis=0)
+    simdata = ticker.simulate_returns(
+        forecast_days, starting_balance, sims=sims, rng=seed
+    )
+    bands, mid = help.calculate_percentile_bands(simdata, confidences=(95, 50), axis=0)
 
     # Create a continuous x-axis date range
-    x_hist = historic_data.index
     x_sim = pd.date_range(
-        start=x_hist[-1] + pd.Timedelta(days=1), periods=forecast_days, freq="D"
+        start=historic_data.index[-1] + pd.Timedelta(days=1), periods=forecast_days, freq="D"
+    ).values
+
+    # Downsample the bands at the points that preserve the shape of the median
+    keep = downsample.lttb_indices(x_sim, mid, max_points)
+    x_sim = x_sim[keep]
+    low, high = bands[95][0][keep], bands[95][1][keep]
+    bq, uq = bands[50][0][keep], bands[50][1][keep]
+
+    x_hist, historic_data = downsample.downsample(
+        historic_data.index.values, historic_data.values, max_points
     )
 
     # Create a Plotly figure
@@ -104,19 +127,21 @@ def plot_simulated_balance(
     )
 
     # Fill between the low and high percentiles
+    x_band, y_band = _band_polygon(x_sim, bq, uq)
     fig.add_trace(
         go.Scatter(
-            x=list(x_sim) + list(x_sim)[::-1],
-            y=list(bq) + list(uq)[::-1],
+            x=x_band,
+            y=y_band,
             fill="toself",
             name="50% CI",
             marker=dict(color="lime"),
         )
     )
+    x_band, y_band = _band_polygon(x_sim, low, high)
     fig.add_trace(
         go.Scatter(
-            x=list(x_sim) + list(x_sim)[::-1],
-            y=list(low) + list(high)[::-1],
+            x=x_band,
+            y=y_band,
             fill="toself",
             name="95% CI",
             marker=dict(color="lightgreen"),
@@ -134,6 +159,7 @@ def plot_simulated_balance(
     return fig
 
 
+@tracing.traced()
 def plot_ticker_autocorrelation(ticker: Ticker, max_lag=60):
     df = ticker.calculate_autocorrelation(max_lag=max_lag)
 
@@ -172,29 +198,42 @@ def plot_ticker_autocorrelation(ticker: Ticker, max_lag=60):
     return fig
 
 
-def plot_simulated_portfolio(portfolio: Portfolio, forecast_days: int, sims=1000):
-    simdata = portfolio.simulate_portfolio(days=forecast_days, sims=sims)
-    date_range = time.create_date_range(dt.datetime.today(), forecast_days + 1)
+@tracing.traced()
+def plot_simulated_portfolio(
+    portfolio: Portfolio, forecast_days: int, sims=1000, max_points=downsample.MAX_POINTS
+):
+    summary = portfolio.simulate_portfolio_summary(
+        days=forecast_days, sims=sims, confidences=(95, 50)
+    )
+    date_range = np.array(
+        time.create_date_range(dt.datetime.today(), forecast_days + 1), dtype="datetime64[ns]"
+    )
 
-    low, mid, high = help.calculate_percentiles(simdata, axis=0, confidence=95)
-    bq, _, uq = help.calculate_percentiles(simdata, axis=0, confidence=50)
+    # Downsample the bands at the points that preserve the shape of the median
+    keep = downsample.lttb_indices(date_range, summary["median"], max_points)
+    date_range = date_range[keep]
+    low, high = summary["bands"][95][0][keep], summary["bands"][95][1][keep]
+    bq, uq = summary["bands"][50][0][keep], summary["bands"][50][1][keep]
+    mid = summary["median"][keep]
 
     fig = go.Figure()
 
     # Fill between the low and high percentiles
+    x_band, y_band = _band_polygon(date_range, low, high)
     fig.add_trace(
         go.Scatter(
-            x=list(date_range) + list(date_range)[::-1],
-            y=list(low) + list(high)[::-1],
+            x=x_band,
+            y=y_band,
             fill="toself",
             name="95% CI",
             marker=dict(color="lightgreen"),
         )
     )
+    x_band, y_band = _band_polygon(date_range, bq, uq)
     fig.add_trace(
         go.Scatter(
-            x=list(date_range) + list(date_range)[::-1],
-            y=list(bq) + list(uq)[::-1],
+            x=x_band,
+            y=y_band,
             fill="toself",
             name="50% CI",
             marker=dict(color="lime"),
@@ -222,6 +261,7 @@ def plot_simulated_portfolio(portfolio: Portfolio, forecast_days: int, sims=1000
     return fig
 
 
+@tracing.traced()
 def plot_portfolio_corr_heatmap(portfolio: Portfolio):
     corr_matrix = portfolio.get_corr_matrix()
     text_annotations = [[f"{value:.2f}" for value in row] for row in corr_matrix.values]
@@ -245,41 +285,143 @@ def plot_portfolio_corr_heatmap(portfolio: Portfolio):
     return fig
 
 
-def plot_portfolio_optimization(portfolio: Portfolio, sims=25_000):
-    df = portfolio.simulate_portfolio_optimization(sims=sims)
+def _portfolio_hover_data(df: pd.DataFrame, ticker_codes, sharpe_ratio):
+    """
+    Customdata array and hovertemplate showing each portfolio's weights and Sharpe ratio.
+
+    The template is formatted by plotly in the browser, so no per point strings are built.
+    """
+    customdata = np.column_stack([df[ticker_codes].to_numpy(), sharpe_ratio])
+    hovertemplate = "<br>".join(
+        f"{ticker}: %{{customdata[{i}]:.2f}}" for i, ticker in enumerate(ticker_codes)
+    )
+    hovertemplate += f"<br><br>Sharpe Ratio: %{{customdata[{len(ticker_codes)}]:.2f}}<extra></extra>"
+    return customdata, hovertemplate
+
+
+def _thin_by_density(x: np.ndarray, y: np.ndarray, max_points: int, bins=200) -> np.ndarray:
+    """
+    Indices of at most max_points points, thinning dense regions first.
+
+    Points are binned on a bins x bins grid and each cell keeps at most the same number of points,
+    so sparse regions such as the edge of the feasible set are kept in full.
+    """
+    if len(x) <= max_points:
+        return np.arange(len(x))
+
+    # At most one cell per kept point, so every occupied cell keeps at least one
+    bins = max(1, min(bins, int(np.sqrt(max_points))))
+
+    def to_bins(values):
+        span = values.max() - values.min()
+        scaled = (values - values.min()) / (span if span > 0 else 1)
+        return np.minimum((scaled * bins).astype(np.intp), bins - 1)
+
+    cells = to_bins(x) * bins + to_bins(y)
+    counts = np.bincount(cells, minlength=bins * bins)
+
+    # Largest per-cell cap that keeps the total under max_points
+    low, high = 0, int(counts.max())
+    while low < high:
+        cap = (low + high + 1) // 2
+        if np.minimum(counts, cap).sum() <= max_points:
+            low = cap
+        else:
+            high = cap - 1
+
+    order = np.argsort(cells, kind="stable")
+    cell_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank_in_cell = np.arange(len(cells)) - cell_starts[cells[order]]
+    return np.sort(order[rank_in_cell < low])
+
+
+@tracing.traced()
+def plot_portfolio_optimization(
+    portfolio: Portfolio,
+    sims=25_000,
+    method="monte_carlo",
+    points=50,
+    seed=None,
+    max_points=None,
+):
+    """
+    Plot portfolio mean returns against volatility.
+
+    The "monte_carlo" method scatters sims randomly weighted portfolios with WebGL. Set max_points to thin dense
+    regions of very large runs down to that many points. The "frontier" method solves the efficient frontier
+    at a number of points directly and marks the minimum variance and max Sharpe portfolios.
+    """
     ticker_codes = portfolio.get_ticker_codes()
-    risk_free_rate = help.calculate_risk_free_rate()
-    sharpe_ratio = help.calculate_sharpe_ratio(df["Mean"], df["Volatility"])
-
-    # Create hover text
-    hover_texts = []
-    for i, row in df.iterrows():
-        hover_text = "<br>".join(
-            f"{ticker}: {weight:.2f}"
-            for ticker, weight in zip(ticker_codes, row[ticker_codes])
+    risk_free_rate = help.get_risk_free_rate()
+
+    if method == "frontier":
+        df = portfolio.get_efficient_frontier(points=points)
+    elif method == "monte_carlo":
+        df = portfolio.simulate_portfolio_optimization(sims=sims, seed=seed)
+        if max_points is not None:
+            keep = _thin_by_density(
+                df["Volatility"].to_numpy(), df["Mean"].to_numpy(), max_points
+            )
+            df = df.iloc[keep]
+    else:
+        raise ValueError(f"Unknown optimization method: {method}")
+
+    sharpe_ratio = np.asarray(
+        help.calculate_sharpe_ratio(
+            df["Mean"], df["Volatility"], risk_free_rate=risk_free_rate
         )
-        hover_text += "<br>"
-        hover_text += f"<br>Sharpe Ratio: {sharpe_ratio[i]:.2f}"
-        hover_texts.append(hover_text)
+    )
+    customdata, hovertemplate = _portfolio_hover_data(df, ticker_codes, sharpe_ratio)
+
+    scatter_type = go.Scatter if method == "frontier" else go.Scattergl
 
     fig = go.Figure()
     fig.add_trace(
-        go.Scatter(
-            x=df["Volatility"],
-            y=df["Mean"],
-            mode="markers",
+        scatter_type(
+            x=df["Volatility"].to_numpy(),
+            y=df["Mean"].to_numpy(),
+            mode="lines+markers" if method == "frontier" else "markers",
             marker=dict(
                 color=sharpe_ratio,
                 colorbar=dict(title="Sharpe Ratio"),
                 colorscale="viridis",
             ),
-            hoverinfo="text",
-            text=hover_texts,
+            line=dict(color="lightgrey"),
+            customdata=customdata,
+            hovertemplate=hovertemplate,
+            showlegend=False,
         )
     )
 
+    if method == "frontier":
+        optimal = pd.DataFrame(
+            [
+                portfolio.get_minimum_variance_portfolio(),
+                portfolio.get_max_sharpe_portfolio(risk_free_rate=risk_free_rate),
+            ]
+        )
+        optimal_sharpe = np.asarray(
+            help.calculate_sharpe_ratio(
+                optimal["Mean"], optimal["Volatility"], risk_free_rate=risk_free_rate
+            )
+        )
+        optimal_customdata, _ = _portfolio_hover_data(optimal, ticker_codes, optimal_sharpe)
+        fig.add_trace(
+            go.Scatter(
+                x=optimal["Volatility"],
+                y=optimal["Mean"],
+                mode="markers+text",
+                marker=dict(color="red", size=14, symbol="star"),
+                text=["Min Variance", "Max Sharpe"],
+                textposition="top left",
+                customdata=optimal_customdata,
+                hovertemplate=hovertemplate,
+                showlegend=False,
+            )
+        )
+
     fig.add_hline(y=risk_free_rate, line_dash="dash", line_color="blue")
-    fig.update_xaxes(range=[0, max(df["Volatility"]) * 1.1])
+    fig.update_xaxes(range=[0, df["Volatility"].max() * 1.1])
     fig.update_layout(
         title="Portfolio Optimization",
         xaxis_title="Volatility",
@@ -49,13 +49,17 @@ def plot_simulated_balance(
     if starting_balance is None:
         starting_balance = ticker.get_current_price()
 
-    historic_data = ticker.df["Close"][ticker.df.index >= start_date]
+    historic_data = ticker.get_close_prices()
+    historic_data = historic_data[historic_data.index >= start_date]
 
     # Simulate the future data
     simdata = ticker.simulate_returns(forecast_days, starting_balance, sims=sims)
-    low, mid, high = help.calculate_percentiles(simdata, confidence=95, axis=0)
-    p90, _, p10 = help.calculate_percentiles(simdata, confidence=80, axis=0)
-    p75, _, p25 = help.calculate_percentiles(simdata, confidence=50, axis=0)
+    bands, mid = help.calculate_percentile_bands(
+        simdata, confidences=(95, 80, 50), axis=0
+    )
+    low, high = bands[95]
+    p90, p10 = bands[80]
+    p75, p25 = bands[50]
 
     fig, ax = plt.subplots(figsize=ps.LONGPLOT)
 
@@ -0,0 +1,232 @@
+import argparse
+import datetime as dt
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app import dynamic_plots as plot
+from lib.portfolio import Portfolio
+from lib.ticker import Ticker
+from lib.utils import cache, fitting as fit, providers, simulation as sim
+from benchmarks.synthetic import build_synthetic_provider
+
+
+# Scaling grids, QUICK_GRID is small enough to run on every change
+GRID = {
+    "tickers": [2, 5, 20],
+    "years": [5, 20],
+    "days": [252, 2520],
+    "sims": [1_000, 10_000],
+}
+QUICK_GRID = {
+    "tickers": [2, 5],
+    "years": [5],
+    "days": [252],
+    "sims": [1_000],
+}
+
+# Minimum time ratios against a baseline that count as a regression
+REGRESSION_THRESHOLD = 1.25
+
+
+def get_codes(num_tickers: int) -> list[str]:
+    return [f"SYN{i:03d}" for i in range(num_tickers)]
+
+
+def reset_cache(root: Path):
+    """Point the local cache at an empty directory and clear in-process memos, so loads start cold"""
+    cache.CACHE_DIR = Path(tempfile.mkdtemp(dir=root))
+    fit._fit_annualized_student_t.cache_clear()
+
+
+def measure(func, setup=None, repeat=5) -> list[float]:
+    """Time repeat calls of func, running setup (untimed) before each"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def get_cases(grid: dict, root: Path):
+    """
+    Yield (benchmark, params, func, setup) for every benchmark and point of the scaling grid.
+
+    Construction benchmarks run against a cold cache, everything else reuses tickers and portfolios
+    built once per grid point.
+    """
+    cold = lambda: reset_cache(root)
+
+    for years in grid["years"]:
+        yield "ticker_construction", {"years": years}, lambda: Ticker(
+            "SYN000", years=years, asx=False
+        ), cold
+
+    for num_tickers, years in itertools.product(grid["tickers"], grid["years"]):
+        codes = get_codes(num_tickers)
+        holdings = {code: 100 for code in codes}
+        yield "portfolio_construction", {"tickers": num_tickers, "years": years}, lambda: Portfolio(
+            holdings, years=years, asx=False
+        ), cold
+
+    for years in grid["years"]:
+        ticker = Ticker("SYN000", years=years, asx=False)
+        log_returns = ticker.get_log_returns()
+        yield "calculate_lag_correlations", {"years": years}, lambda: sim.calculate_lag_correlations(
+            log_returns, max_lag=60
+        ), None
+
+        for days, sims in itertools.product(grid["days"], grid["sims"]):
+            params = {"years": years, "days": days, "sims": sims}
+            yield "plot_simulated_balance", params, lambda: plot.plot_simulated_balance(
+                ticker, ticker.start_date, days, sims=sims, seed=0
+            ), None
+
+    years = grid["years"][0]
+    for num_tickers in grid["tickers"]:
+        holdings = {code: 100 for code in get_codes(num_tickers)}
+        portfolio = Portfolio(holdings, years=years, asx=False)
+
+        for days, sims in itertools.product(grid["days"], grid["sims"]):
+            params = {"tickers": num_tickers, "days": days, "sims": sims}
+            yield "simulate_correlated_returns", params, lambda: portfolio.simulate_correlated_returns(
+                days, sims=sims, rng=0
+            ), None
+            yield "simulate_portfolio", params, lambda: portfolio.simulate_portfolio(
+                days, sims=sims, seed=0
+            ), None
+            yield "plot_simulated_portfolio", params, lambda: plot.plot_simulated_portfolio(
+                portfolio, days, sims=sims
+            ), None
+
+        for sims in grid["sims"]:
+            params = {"tickers": num_tickers, "sims": sims * 10}
+            yield "simulate_portfolio_optimization", params, lambda: portfolio.simulate_portfolio_optimization(
+                sims=sims * 10, seed=0
+            ), None
+            yield "plot_portfolio_optimization", params, lambda: plot.plot_portfolio_optimization(
+                portfolio, sims=sims * 10, seed=0
+            ), None
+
+
+def get_metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "created_at": dt.datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def run_benchmarks(grid: dict, repeat=5, only=None) -> dict:
+    """Run every benchmark over the grid against synthetic data and return the results as a dict"""
+    results = []
+    original_cache_dir = cache.CACHE_DIR
+    provider = build_synthetic_provider(get_codes(max(grid["tickers"])), max(grid["years"]))
+    original_provider = providers.set_default_provider(provider)
+
+    with tempfile.TemporaryDirectory() as root:
+        root = Path(root)
+        reset_cache(root)
+        try:
+            for name, params, func, setup in get_cases(grid, root):
+                if only and name not in only:
+                    continue
+
+                func()  # Warm up imports and lazily computed attributes
+                times = measure(func, setup=setup, repeat=repeat)
+                results.append(
+                    {
+                        "benchmark": name,
+                        "params": params,
+                        "times": times,
+                        "min": min(times),
+                        "median": statistics.median(times),
+                        "mean": statistics.mean(times),
+                    }
+                )
+                print(f"{name:<34} {json.dumps(params):<52} {min(times) * 1000:10.2f} ms")
+        finally:
+            cache.CACHE_DIR = original_cache_dir
+            providers.set_default_provider(original_provider)
+
+    return {"metadata": get_metadata(), "results": results}
+
+
+def _result_key(result: dict) -> str:
+    return result["benchmark"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare_results(baseline: dict, current: dict, threshold=REGRESSION_THRESHOLD) -> list[dict]:
+    """
+    Compare minimum times against a baseline.
+
+    Returns the results slower than the baseline by more than threshold, with their ratios.
+    """
+    baseline_times = {_result_key(result): result["min"] for result in baseline["results"]}
+
+    regressions = []
+    for result in current["results"]:
+        base = baseline_times.get(_result_key(result))
+        if base is None:
+            continue
+
+        ratio = result["min"] / base
+        if ratio > threshold:
+            regressions.append({**result, "baseline_min": base, "ratio": ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths against synthetic market data")
+    parser.add_argument("--output", default="benchmark_results.json", help="Path of the JSON results")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--quick", action="store_true", help="Use the small scaling grid")
+    parser.add_argument("--only", nargs="+", help="Only run these benchmarks")
+    parser.add_argument("--compare", help="Baseline JSON results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run_benchmarks(QUICK_GRID if args.quick else GRID, repeat=args.repeat, only=args.only)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        regressions = compare_results(baseline, results, threshold=args.threshold)
+        for result in regressions:
+            print(
+                f"REGRESSION {result['benchmark']} {json.dumps(result['params'])}: "
+                f"{result['baseline_min'] * 1000:.2f} ms -> {result['min'] * 1000:.2f} ms "
+                f"({result['ratio']:.2f}x)"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
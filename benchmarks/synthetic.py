@@ -0,0 +1,45 @@
+import datetime as dt
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from lib.utils.providers import InMemoryProvider
+
+
+def generate_history(symbol: str, start: dt.datetime, end: dt.datetime, seed=0) -> pd.DataFrame:
+    """
+    Deterministic synthetic daily prices for a symbol over business days from start to end.
+
+    Closes follow a geometric random walk with Student-t log returns, whose parameters are derived from
+    the symbol and the seed. Symbols starting with "^" are treated as yields quoted in percent.
+    """
+    rng = np.random.default_rng([zlib.crc32(symbol.encode()), seed])
+    if symbol.startswith("^"):
+        df, loc, scale, start_price = 5.0, 0.0, 0.001, rng.uniform(2, 5)
+    else:
+        df = rng.uniform(3, 8)
+        loc = rng.uniform(-0.0002, 0.0008)
+        scale = rng.uniform(0.006, 0.02)
+        start_price = rng.uniform(5, 200)
+
+    days = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+    log_returns = loc + scale * rng.standard_t(df, len(days))
+    close = start_price * np.exp(np.cumsum(log_returns))
+
+    return pd.DataFrame(
+        {"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1e6},
+        index=days,
+    )
+
+
+def build_synthetic_provider(symbols, years: int, seed=0) -> InMemoryProvider:
+    """In-memory provider with synthetic histories covering the last years for each symbol and ^IRX"""
+    end = dt.datetime.today() + dt.timedelta(days=1)
+    start = end - dt.timedelta(days=int(365 * years) + 7)
+
+    symbols = list(symbols) + ["^IRX"]
+    return InMemoryProvider(
+        {symbol: generate_history(symbol, start, end, seed=seed) for symbol in symbols},
+        info={symbol: {"longName": f"Synthetic {symbol}"} for symbol in symbols},
+    )
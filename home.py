@@ -1,16 +1,18 @@
+import json
+
 import streamlit as st
 import pandas as pd
-from lib.ticker import Ticker
-from lib.portfolio import Portfolio
-from app import dynamic_plots as plot
+from app import cache
+from lib.utils import tracing
 
 st.set_page_config(layout="wide")
 
 
 def update_ticker(ticker_code, years, asx):
     if ticker_code:
-        st.session_state.ticker = Ticker(code=ticker_code, years=years, asx=asx)
-        st.session_state.company_name = st.session_state.ticker.get_company_name()
+        st.session_state.ticker_key = (ticker_code, years, asx)
+        st.session_state.ticker = cache.load_ticker(ticker_code, years, asx)
+        st.session_state.company_name = cache.get_company_name(ticker_code, years, asx)
 
 
 def update_portfolio(portfolio_df, years, asx):
@@ -18,7 +20,33 @@ def update_portfolio(portfolio_df, years, asx):
     for i, row in portfolio_df.iterrows():
         holdings[row["Code"]] = row["Units"]
 
-    st.session_state.portfolio = Portfolio(holdings, years=years, asx=asx)
+    st.session_state.portfolio = cache.load_portfolio(
+        tuple(sorted(holdings.items())), years=years, asx=asx
+    )
+
+
+def update_session_portfolio(holdings, years, asx):
+    """
+    Bring the session's portfolio in line with the holdings, only loading added tickers.
+
+    The portfolio is rebuilt from the shared cache when the years or market change.
+    """
+    portfolio = st.session_state.get("portfolio")
+    if portfolio is None or portfolio.years != years or portfolio.asx != asx:
+        # Copy so in-place edits never change the shared cached portfolio
+        st.session_state.portfolio = cache.load_portfolio(holdings, years, asx).copy()
+        return
+
+    holdings = dict(holdings)
+    for code in portfolio.get_ticker_codes():
+        if code not in holdings:
+            portfolio.remove_holding(code)
+
+    for code, units in holdings.items():
+        if code in portfolio.holdings:
+            portfolio.set_units(code, units)
+        else:
+            portfolio.add_holding(code, units)
 
 
 def add_tickers_to_portfolio():
@@ -39,12 +67,59 @@ def remove_tickers_from_portfolio():
     ]
 
 
+def show_timings(collector):
+    """
+    Show the time spent in each traced stage, nested by call, with a download of the full trace.
+
+    Only stages run by this session, and by the worker threads it started, are shown.
+    """
+    with st.sidebar.expander("Timings", expanded=True):
+        if collector is None or not collector.spans:
+            st.caption("Stage timings are shown after the next rerun.")
+            return
+
+        summary = pd.DataFrame(collector.summary())
+        stages = pd.DataFrame(
+            {
+                "Stage": [
+                    "\u2003" * depth + path.rsplit("/", 1)[-1]
+                    for depth, path in zip(summary["depth"], summary["path"])
+                ],
+                "Calls": summary["count"],
+                "Total (ms)": summary["total"] * 1000,
+                "Mean (ms)": summary["mean"] * 1000,
+            }
+        )
+        st.dataframe(stages, hide_index=True, use_container_width=True)
+
+        if collector.counters:
+            counters = pd.Series(collector.counters, name="Count").rename_axis("Counter")
+            st.dataframe(counters, use_container_width=True)
+
+        st.download_button(
+            "Download Trace",
+            json.dumps(collector.to_trace()),
+            file_name="trace.json",
+            mime="application/json",
+        )
+
+
 if "ticker_list" not in st.session_state:
     st.session_state.ticker_list = []
 
 st.session_state.page = st.sidebar.radio(
     label="Page", options=["Individual", "Portfolio"], horizontal=True
 )
+
+# Each rerun is traced while timings are shown, and the breakdown of the previous rerun is displayed.
+# The collector is held in the session state and only enabled in the context of this session's script run.
+tracing.stop()
+if "trace" in st.session_state:
+    st.session_state.last_trace = st.session_state.pop("trace")
+
+if st.sidebar.toggle("Show Timings"):
+    show_timings(st.session_state.get("last_trace"))
+    st.session_state.trace = tracing.start()
 st.sidebar.divider()
 
 if st.session_state.page == "Individual":
@@ -75,25 +150,23 @@ if st.session_state.page == "Individual":
         st.info("Enter a ticker code to get started.")
         st.stop()
 
+    ticker_key = st.session_state.ticker_key
+
     with seg1:
-        fig1 = plot.plot_returns_fit(st.session_state.ticker)
+        fig1 = cache.ticker_fit_figure(*ticker_key)
         st.plotly_chart(fig1, use_container_width=True)
 
     with seg2:
-        fig2 = plot.plot_log_returns(
-            st.session_state.ticker, start_date=st.session_state.ticker.start_date
-        )
+        fig2 = cache.ticker_log_returns_figure(*ticker_key)
         st.plotly_chart(fig2, use_container_width=True)
 
     with seg3:
-        fig3 = plot.plot_ticker_autocorrelation(st.session_state.ticker, max_lag=100)
+        fig3 = cache.ticker_autocorrelation_figure(*ticker_key, max_lag=100)
         st.plotly_chart(fig3, use_container_width=True)
 
     st.divider()
 
-    fig3 = plot.plot_simulated_balance(
-        st.session_state.ticker, st.session_state.ticker.start_date, forecast_days
-    )
+    fig3 = cache.ticker_simulation_figure(*ticker_key, forecast_days=forecast_days)
     st.plotly_chart(fig3, use_container_width=True)
 
 elif st.session_state.page == "Portfolio":
@@ -101,6 +174,11 @@ elif st.session_state.page == "Portfolio":
         market = st.radio("Market", options=["ASX", "NASDAQ"], horizontal=True)
         asx = market == "ASX"
         years = st.number_input("Years", min_value=1, max_value=25, value=3)
+        optimization_method = st.radio(
+            "Optimization",
+            options=["Monte Carlo", "Efficient Frontier"],
+            horizontal=True,
+        )
         st.divider()
 
         ticker_list = st.session_state.ticker_list
@@ -121,17 +199,22 @@ elif st.session_state.page == "Portfolio":
     if not st.session_state.ticker_list:
         st.stop()
 
-    holdings = {key: 100 for key in st.session_state.ticker_list}
+    holdings = tuple(sorted((key, 100) for key in st.session_state.ticker_list))
 
     simulate_portfolio = st.button("Optimize Portfolio")
     if simulate_portfolio:
-        st.session_state.portfolio = Portfolio(holdings=holdings, years=years, asx=asx)
+        update_session_portfolio(holdings, years=years, asx=asx)
+        portfolio = st.session_state.portfolio
 
         seg1, seg2 = st.columns(2)
 
-        heatmap = plot.plot_portfolio_corr_heatmap(st.session_state.portfolio)
-        portfolio_optimization_plot = plot.plot_portfolio_optimization(
-            st.session_state.portfolio
+        heatmap = cache.portfolio_corr_heatmap(holdings, years, asx, _portfolio=portfolio)
+        portfolio_optimization_plot = cache.portfolio_optimization_figure(
+            holdings,
+            years,
+            asx,
+            method="frontier" if optimization_method == "Efficient Frontier" else "monte_carlo",
+            _portfolio=portfolio,
         )
 
         seg1.plotly_chart(heatmap, use_container_width=True)
@@ -0,0 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .ticker import Ticker
+from .utils import cache, fitting as fit, tracing
+
+
+@tracing.traced()
+def load_tickers(
+    codes: list[str], years: int, asx=True, max_workers=None, provider=None
+) -> list[Ticker]:
+    """
+    Load and fit a list of tickers concurrently.
+
+    Price data is fetched on a thread pool so network requests overlap, then the distributions of all
+    tickers without cached parameters are fitted together in a single batched fit.
+    max_workers sets the size of the thread pool, defaulting to the executor default.
+    provider is the data provider of every ticker, see Ticker.
+
+    Tickers are returned in the same order as codes.
+    """
+    codes = list(codes)
+    if max_workers == 1 or len(codes) <= 1:
+        return [Ticker(code, years=years, asx=asx, provider=provider) for code in codes]
+
+    def load_prices(code):
+        return Ticker(code, years=years, asx=asx, fit_dists=False, provider=provider)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        tickers = list(pool.map(tracing.propagate(load_prices), codes))
+
+    unfitted = []
+    for ticker in tickers:
+        params = cache.read_fit_params(ticker.get_fit_cache_key(), "daily")
+        if params is None:
+            unfitted.append(ticker)
+        else:
+            ticker.dist = fit.StudentT(*params)
+
+    if unfitted:
+        # Outer join the returns into one panel, missing days are NaN and ignored by the fit
+        returns = pd.concat(
+            [ticker.get_log_returns().rename(i) for i, ticker in enumerate(unfitted)],
+            axis=1,
+        )
+        dists = fit.fit_student_t_batch(returns.to_numpy())
+
+        for ticker, dist in zip(unfitted, dists):
+            ticker.dist = dist
+            cache.write_fit_params(ticker.get_fit_cache_key(), "daily", dist, flush=False)
+        cache.flush_fit_cache()
+
+    return tickers
@@ -1,8 +1,59 @@
+import copy
+
 import numpy as np
 import pandas as pd
 
+from .loader import load_tickers
 from .ticker import Ticker
-from .utils import simulation as sim
+from .utils import cache, helper, optimization as opt, parallel, simulation as sim, tracing
+from .utils.panel import ReturnsPanel
+from .utils.quantiles import QuantileSketch
+
+
+# Block functions for parallel simulation, kept at module level so process pools can pickle them
+
+
+def _simulate_balance_block(
+    factor, df, loc, scale, starting_balances, days, sims, seed, sampling="random"
+):
+    log_returns = sim.simulate_correlated_t_returns(
+        factor, df, loc, scale, days=days, sims=sims, rng=seed, sampling=sampling
+    )
+    return sim.calculate_portfolio_balance(log_returns, starting_balances)
+
+
+def _summarize_balance_block(
+    factor, df, loc, scale, starting_balances, days, sims, seed, sampling, relative_accuracy
+):
+    balance = _simulate_balance_block(
+        factor, df, loc, scale, starting_balances, days, sims, seed, sampling
+    )
+    sketch = QuantileSketch(days + 1, relative_accuracy=relative_accuracy)
+    sketch.update(balance)
+    return sketch, balance.sum(axis=0), balance[:, -1]
+
+
+def _simulate_annualized_block(factor, df, loc, scale, sims, seed, sampling="random"):
+    uniform_samples = sim.simulate_correlated_uniform_samples(
+        num_elements=len(df),
+        corr_matrix=None,
+        sims=sims,
+        factor=factor,
+        rng=seed,
+        sampling=sampling,
+    )
+
+    # Transpose to (num_tickers, sims)
+    return sim.student_t_ppf(uniform_samples.T, df[:, None], loc[:, None], scale[:, None])
+
+
+def _evaluate_weights_block(returns, cov_matrix, sims, dtype, seed):
+    weights = sim.generate_random_weights(len(returns), sims=sims, rng=seed)
+    weights = weights.astype(dtype, copy=False)
+    means, volatilities = sim.calculate_portfolio_performance_batch(
+        returns, weights, cov_matrix, dtype=dtype
+    )
+    return weights, means, volatilities
 
 
 class Portfolio:
@@ -12,27 +63,109 @@ class Portfolio:
     Constructed with a holdings dict, where each key is a ticker code and each value is the units owned.
 
     The years argument sets the length of time to go back for historical analysis.
+
+    Tickers are loaded concurrently, max_workers sets the number of workers used (1 loads them serially).
+    provider is the data provider of every ticker, see Ticker.
+
+    Log returns are aligned into a ReturnsPanel, whose cached correlations and Cholesky factor are reused by
+    every simulation and optimization. missing sets how days without a return for some tickers are handled,
+    see panel.MISSING_POLICIES.
+
+    Holdings can be edited in place with add_holding, remove_holding and set_units, which only load the new
+    ticker and update the returns, correlations and cached factorization incrementally.
     """
 
-    def __init__(self, holdings: dict[str, int], years: int, asx=True):
-        self.holdings = holdings
+    @tracing.traced()
+    def __init__(
+        self,
+        holdings: dict[str, int],
+        years: int,
+        asx=True,
+        max_workers=None,
+        provider=None,
+        missing="pairwise",
+    ):
+        self.holdings = dict(holdings)
+        self.years = years
+        self.asx = asx
+        self.max_workers = max_workers
+        self.provider = provider
         self.tickers = self.build_tickers_list(years, asx)
-        self.log_returns_df = self.build_log_returns_df()
-        self.corr_matrix = self.get_corr_matrix()
+        self.returns_panel = self.build_returns_panel(missing)
         self.annual_dists = self.get_annualized_return_dists()
 
     def build_tickers_list(self, years, asx):
-        tickers = []
-        for code in self.holdings:
-            tickers.append(Ticker(code, years=years, asx=asx))
-        return tickers
+        return load_tickers(
+            list(self.holdings),
+            years=years,
+            asx=asx,
+            max_workers=self.max_workers,
+            provider=self.provider,
+        )
 
-    def build_log_returns_df(self):
-        data = {}
-        for ticker in self.tickers:
-            data[ticker.code] = ticker.get_log_returns()
+    def build_returns_panel(self, missing="pairwise") -> ReturnsPanel:
+        return ReturnsPanel(
+            {ticker.code: ticker.get_log_returns() for ticker in self.tickers}, missing=missing
+        )
 
-        return pd.DataFrame(data)
+    @property
+    def log_returns_df(self) -> pd.DataFrame:
+        return self.returns_panel.to_df()
+
+    @property
+    def corr_matrix(self) -> pd.DataFrame:
+        return self.get_corr_matrix()
+
+    def copy(self):
+        """
+        Copy of the portfolio whose holdings can be edited without affecting this one.
+
+        Tickers and data are shared, edits replace rather than modify them.
+        """
+        other = copy.copy(self)
+        other.holdings = dict(self.holdings)
+        other.tickers = list(self.tickers)
+        other.returns_panel = self.returns_panel.copy()
+        other.annual_dists = list(self.annual_dists)
+        return other
+
+    @tracing.traced()
+    def add_holding(self, code: str, units: int):
+        """
+        Add a ticker to the portfolio, loading only that ticker.
+
+        The returns panel, its correlation matrix and Cholesky factor are extended by one row and column.
+        If the code is already held its units are updated instead.
+        """
+        if code in self.holdings:
+            self.set_units(code, units)
+            return
+
+        ticker = Ticker(code, years=self.years, asx=self.asx, provider=self.provider)
+        self.returns_panel.add(code, ticker.get_log_returns())
+
+        self.holdings[code] = units
+        self.tickers = self.tickers + [ticker]
+        self.annual_dists = self.annual_dists + [ticker.get_annualized_return_dist()]
+
+    @tracing.traced()
+    def remove_holding(self, code: str):
+        """
+        Remove a ticker from the portfolio.
+
+        The returns panel, its correlation matrix and Cholesky factor have the ticker's row and column deleted.
+        """
+        index = self.get_ticker_codes().index(code)
+        self.returns_panel.remove(code)
+
+        self.holdings = {k: v for k, v in self.holdings.items() if k != code}
+        self.tickers = self.tickers[:index] + self.tickers[index + 1 :]
+        self.annual_dists = self.annual_dists[:index] + self.annual_dists[index + 1 :]
+
+    def set_units(self, code: str, units: int):
+        if code not in self.holdings:
+            raise KeyError(f"{code} is not held in the portfolio")
+        self.holdings = {**self.holdings, code: units}
 
     def get_ticker_codes(self):
         codes = []
@@ -68,19 +201,38 @@ class Portfolio:
             balance += price * units
         return balance
 
+    def get_starting_balances(self) -> np.ndarray:
+        """Current value of each holding, in the order of tickers"""
+        return np.array(
+            [ticker.get_current_price() * self.get_units(ticker.code) for ticker in self.tickers],
+            dtype=np.float64,
+        )
+
     def get_corr_matrix(self):
-        return self.log_returns_df.corr()
+        codes = self.returns_panel.codes
+        return pd.DataFrame(self.returns_panel.get_corr(), index=codes, columns=codes)
 
     def get_cov_matrix(self):
-        return self.log_returns_df.cov()
+        codes = self.returns_panel.codes
+        return pd.DataFrame(self.returns_panel.get_cov(), index=codes, columns=codes)
+
+    def get_corr_cholesky(self) -> np.ndarray:
+        """Cholesky factor of the correlation matrix, computed once and reused by the simulations."""
+        return self.returns_panel.get_corr_cholesky()
+
+    def calculate_autocorrelations(self, max_lag=60) -> dict[str, pd.DataFrame]:
+        """Lag correlations of every ticker's log returns, keyed by ticker code"""
+        return sim.calculate_panel_lag_correlations(self.log_returns_df, max_lag=max_lag)
 
     def get_units(self, ticker_code: str):
         return self.holdings[ticker_code]
 
     def get_annualized_return_dists(self) -> list:
+        """Annualized return distribution of every ticker, writing any new fits to the cache in one batch"""
         dists = []
         for ticker in self.tickers:
-            dists.append(ticker.get_annualized_return_dist())
+            dists.append(ticker.get_annualized_return_dist(flush=False))
+        cache.flush_fit_cache()
         return dists
 
     def get_annualized_returns(self) -> np.ndarray[float]:
@@ -92,100 +244,271 @@ class Portfolio:
     def get_annualized_volatilities(self) -> np.ndarray[float]:
         volatilities = []
         for ticker in self.tickers:
-            volatilities.append(ticker.get_estimated_annualized_returns())
+            volatilities.append(ticker.get_estimated_annualized_volatility())
         return np.array(volatilities)
 
-    def simulate_correlated_returns(self, days: int, sims=1000):
+    def get_simulation_params(self):
+        """Copula factor, marginal (df, loc, scale) arrays and starting balances used by the simulations"""
+        df, loc, scale = sim.get_student_t_params([t.dist for t in self.tickers])
+        return self.get_corr_cholesky(), df, loc, scale, self.get_starting_balances()
+
+    @tracing.traced()
+    def simulate_correlated_returns(self, days: int, sims=1000, rng=None, sampling="random"):
         """
         Simulate correlated portfolio returns.
 
+        rng is a numpy Generator or seed. sampling is "random", "antithetic", "sobol" or "lhs",
+        see simulation.simulate_standard_normal_samples.
+
         Returns a 3D array of shape (days, num_tickers, sims)
         """
-        num_tickers = len(self.tickers)
-        log_returns = np.zeros((days, num_tickers, sims))
-        for i in range(days):
-            uniform_samples = sim.simulate_correlated_uniform_samples(
-                num_elements=num_tickers,
-                corr_matrix=self.get_corr_matrix(),
-                sims=sims,
-            )
+        factor, df, loc, scale, _ = self.get_simulation_params()
+        return sim.simulate_correlated_t_returns(
+            factor, df, loc, scale, days=days, sims=sims, rng=rng, sampling=sampling
+        )
 
-            # Transpose to (num_tickers, sims)
-            uniform_samples = uniform_samples.T
+    @tracing.traced()
+    def simulate_correlated_annualized_returns(
+        self, sims=1000, seed=None, executor="serial", workers=None, sampling="random"
+    ):
+        """
+        Simulate correlated annualized portfolio returns for use in portfolio optimization.
 
-            for j, ticker in enumerate(self.tickers):
-                log_returns[i, j, :] = ticker.dist.ppf(uniform_samples[j, :])
+        Sims are split into blocks run on the executor, see simulate_portfolio.
 
-        return log_returns
+        Returns a 2D array of shape (num_tickers, sims)
+        """
+        df, loc, scale = sim.get_student_t_params(self.annual_dists)
+        factor = self.get_corr_cholesky()
+
+        num_blocks = parallel.get_num_blocks(executor, workers)
+        block_sims = parallel.split_blocks(sims, num_blocks, base2=sampling == "sobol")
+        seeds = parallel.spawn_seeds(seed, len(block_sims))
+
+        blocks = [
+            (factor, df, loc, scale, n, s, sampling) for n, s in zip(block_sims, seeds)
+        ]
+        results = parallel.map_blocks(
+            _simulate_annualized_block, blocks, executor=executor, workers=workers
+        )
+        return np.hstack(results)
+
+    @tracing.traced()
+    def simulate_portfolio(
+        self,
+        days: int,
+        sims=1000,
+        seed=None,
+        executor="serial",
+        workers=None,
+        sampling="random",
+    ):
+        """
+        Simulate the total portfolio balance.
+
+        Paths are split into one block per worker, each simulated from an independent child of seed.
+        executor is "serial", "thread" or "process", and workers sets the number of blocks (defaulting to one
+        when serial and the CPU count otherwise). Results are identical for the same seed and workers,
+        whichever executor runs them.
 
-    def simulate_correlated_annualized_returns(self, sims=1000):
+        sampling is "random", "antithetic", "sobol" or "lhs", applied within each block.
+        Quasi-random and antithetic sampling give tighter percentile bands for the same number of paths.
+
+        Returns an array of shape (sims, days + 1), starting with the current balance.
         """
-        Simulate correlated annualized portfolio returns for use in portfolio optimization.
+        params = self.get_simulation_params()
 
-        Returns a 2D array of shape (num_tickers, sims)
+        num_blocks = parallel.get_num_blocks(executor, workers)
+        block_sims = parallel.split_blocks(sims, num_blocks, base2=sampling == "sobol")
+        seeds = parallel.spawn_seeds(seed, len(block_sims))
+
+        blocks = [(*params, days, n, s, sampling) for n, s in zip(block_sims, seeds)]
+        results = parallel.map_blocks(
+            _simulate_balance_block, blocks, executor=executor, workers=workers
+        )
+        return np.vstack(results)
+
+    @tracing.traced()
+    def simulate_portfolio_summary(
+        self,
+        days: int,
+        sims=1000,
+        confidences=(95, 50),
+        memory_budget=256 * 2**20,
+        relative_accuracy=0.001,
+        seed=None,
+        executor="serial",
+        workers=None,
+        sampling="random",
+    ) -> dict:
+        """
+        Simulate the portfolio in blocks of paths, keeping only the statistics needed for plotting.
+
+        Blocks are sized so the simulation working memory of each worker stays under memory_budget bytes, and
+        each block is reduced into a quantile sketch and merged as it completes, so the full (sims, days) path
+        matrix is never held in memory.
+        Bands and the median are within relative_accuracy of the nearest rank percentiles of the simulated paths,
+        see QuantileSketch.
+
+        Blocks run on the executor with the sampling method as in simulate_portfolio, with at least one block
+        per worker.
+        Results are identical for the same seed, workers and memory_budget.
+
+        Returns a dict with:
+            "bands": {confidence: (low, high)} arrays of length days + 1 for each confidence level
+            "median": median balance, length days + 1
+            "mean": mean balance, length days + 1
+            "terminal": final balance of every path, length sims
         """
         num_tickers = len(self.tickers)
-        log_returns = np.zeros((num_tickers, sims))
-        annual_dists = self.annual_dists
+        params = self.get_simulation_params()
+
+        # Mapping the normal samples onto T marginals holds about five (days, num_tickers) arrays per path,
+        # alongside the balances and the sketch update temporaries
+        bytes_per_path = 8 * (days + 1) * (5 * num_tickers + 6)
+        block_size = int(max(1, memory_budget // bytes_per_path))
+
+        num_blocks = max(parallel.get_num_blocks(executor, workers), -(-sims // block_size))
+        block_sims = parallel.split_blocks(sims, num_blocks, base2=sampling == "sobol")
+        seeds = parallel.spawn_seeds(seed, len(block_sims))
+
+        blocks = [
+            (*params, days, n, s, sampling, relative_accuracy)
+            for n, s in zip(block_sims, seeds)
+        ]
+        results = parallel.imap_blocks(
+            _summarize_balance_block, blocks, executor=executor, workers=workers
+        )
+
+        # Reduce each block as it completes, so only the blocks in flight are held at once
+        sketch = QuantileSketch(days + 1, relative_accuracy=relative_accuracy)
+        balance_sum = np.zeros(days + 1)
+        terminal = np.empty(sims)
+        offset = 0
+        for block_sketch, block_sum, block_terminal in results:
+            sketch.merge(block_sketch)
+            balance_sum += block_sum
+            terminal[offset : offset + len(block_terminal)] = block_terminal
+            offset += len(block_terminal)
+
+        percentiles = sketch.percentiles(helper.get_confidence_percentiles(confidences))
+        bands, median = helper.split_percentile_bands(percentiles, confidences)
+
+        return {
+            "bands": bands,
+            "median": median,
+            "mean": balance_sum / sims,
+            "terminal": terminal,
+        }
+
+    def estimate_band_error(
+        self, days: int, sims=1000, confidences=(95, 50), replicates=10, seed=None, sampling="random"
+    ) -> dict:
+        """
+        Estimate the standard error of simulated percentile bands for a run of sims paths.
+
+        Runs a number of independent replicates of the simulation and measures the spread of their bands,
+        e.g. to compare how many paths each sampling method needs for a given accuracy.
 
-        uniform_samples = sim.simulate_correlated_uniform_samples(
-            num_elements=num_tickers, corr_matrix=self.get_corr_matrix(), sims=sims
+        Returns a dict with:
+            "bands": {confidence: (low, high)} bands averaged over the replicates
+            "standard_error": {confidence: (low, high)} standard error of a single run's bands
+            "median_standard_error": standard error of a single run's median
+        """
+        percentiles = helper.get_confidence_percentiles(confidences)
+        results = np.array(
+            [
+                np.percentile(
+                    self.simulate_portfolio(days, sims=sims, seed=s, sampling=sampling),
+                    q=percentiles,
+                    axis=0,
+                )
+                for s in parallel.spawn_seeds(seed, replicates)
+            ]
         )
 
-        # Transpose to (num_tickers, sims)
-        uniform_samples = uniform_samples.T
+        bands, _ = helper.split_percentile_bands(results.mean(axis=0), confidences)
+        errors, median_error = helper.split_percentile_bands(
+            results.std(axis=0, ddof=1), confidences
+        )
 
-        for i, ticker in enumerate(self.tickers):
-            log_returns[i, :] = annual_dists[i].ppf(uniform_samples[i, :])
+        return {
+            "bands": bands,
+            "standard_error": errors,
+            "median_standard_error": median_error,
+        }
 
-        return log_returns
+    def get_annualized_cov_matrix(self) -> np.ndarray:
+        """Correlation matrix upscaled by the annualized volatilities"""
+        volatilities = self.get_annualized_volatilities()
+        return sim.convert_correlation_matrix(self.returns_panel.get_corr(), volatilities)
 
-    def simulate_portfolio(self, days: int, sims=1000):
-        num_tickers = len(self.tickers)
-        log_returns = self.simulate_correlated_returns(days=days, sims=sims)
+    def build_weights_df(self, weights: np.ndarray) -> pd.DataFrame:
+        """Dataframe of portfolio weights with their annualized Mean and Volatility"""
+        weights = np.atleast_2d(weights)
+        means, volatilities = sim.calculate_portfolio_performance_batch(
+            self.get_annualized_returns(), weights, self.get_annualized_cov_matrix()
+        )
 
-        starting_portfolio_balance = self.get_starting_balance()
+        df = pd.DataFrame(weights, columns=self.get_ticker_codes())
+        df["Mean"] = means
+        df["Volatility"] = volatilities
+        return df
 
-        ticker_balance = np.zeros((num_tickers, days, sims))
-        for i, ticker in enumerate(self.tickers):
-            price = ticker.get_current_price()
-            units = self.get_units(ticker.code)
+    @tracing.traced()
+    def get_efficient_frontier(self, points=50) -> pd.DataFrame:
+        """
+        Solve for the long-only efficient frontier.
 
-            ticker_returns = log_returns[:, i, :]
-            cum_returns = np.cumsum(ticker_returns, axis=0)
+        Returns a dataframe of weights for each ticker with Mean and Volatility columns, one row per point
+        the solver converged on.
+        """
+        weights = opt.efficient_frontier(
+            self.get_annualized_returns(), self.get_annualized_cov_matrix(), points=points
+        )
+        return self.build_weights_df(weights)
 
-            starting_balance = price * units
-            ticker_balance[i] = starting_balance * np.exp(cum_returns)
+    def get_minimum_variance_portfolio(self) -> pd.Series:
+        weights = opt.minimum_variance_weights(self.get_annualized_cov_matrix())
+        return self.build_weights_df(weights).iloc[0]
 
-        portfolio_balance = np.sum(ticker_balance, axis=0)
+    def get_max_sharpe_portfolio(self, risk_free_rate=None) -> pd.Series:
+        if risk_free_rate is None:
+            risk_free_rate = helper.get_risk_free_rate()
 
-        # Add starting balance to start of each simulation
-        starting_balance_col = np.full(
-            shape=sims, fill_value=starting_portfolio_balance
+        weights = opt.max_sharpe_weights(
+            self.get_annualized_returns(), self.get_annualized_cov_matrix(), risk_free_rate
         )
-        portfolio_balance = np.vstack((starting_balance_col, portfolio_balance))
+        return self.build_weights_df(weights).iloc[0]
 
-        # Return the array in shape (sims, days)
-        return portfolio_balance.T
+    @tracing.traced()
+    def simulate_portfolio_optimization(
+        self, sims=10_000, dtype=np.float64, seed=None, executor="serial", workers=None
+    ):
+        """
+        Evaluate the annualized mean and volatility of randomly weighted portfolios.
 
-    def simulate_portfolio_optimization(self, sims=10_000):
-        num_tickers = len(self.tickers)
-        weights = sim.generate_random_weights(num_tickers, sims=sims)
+        Returns a dataframe of the weights for each ticker with Mean and Volatility columns.
+        Set dtype to np.float32 for very large numbers of sims.
+        Sims are split into blocks run on the executor, see simulate_portfolio.
+        """
         returns = self.get_annualized_returns()
-        volatilities = self.get_annualized_volatilities()
-        corr_matrix = self.get_corr_matrix()
+        cov_matrix = self.get_annualized_cov_matrix()
 
-        # Upscale corr matrix by annualized volatilities
-        cov_matrix = sim.convert_correlation_matrix(corr_matrix.values, volatilities)
+        num_blocks = parallel.get_num_blocks(executor, workers)
+        block_sims = parallel.split_blocks(sims, num_blocks)
+        seeds = parallel.spawn_seeds(seed, len(block_sims))
 
-        portfolio_simdata = np.zeros((sims, 2))
-        for p in range(sims):
-            portfolio_simdata[p] = sim.calculate_portfolio_performance(
-                returns, weights[p], cov_matrix
-            )
+        blocks = [(returns, cov_matrix, n, dtype, s) for n, s in zip(block_sims, seeds)]
+        results = parallel.map_blocks(
+            _evaluate_weights_block, blocks, executor=executor, workers=workers
+        )
 
-        df = pd.DataFrame(weights, columns=self.get_ticker_codes())
-        df["Mean"] = portfolio_simdata[:, 0]
-        df["Volatility"] = portfolio_simdata[:, 1]
+        df = pd.DataFrame(
+            np.vstack([weights for weights, _, _ in results]),
+            columns=self.get_ticker_codes(),
+        )
+        df["Mean"] = np.concatenate([means for _, means, _ in results])
+        df["Volatility"] = np.concatenate([volatilities for _, _, volatilities in results])
 
         return df
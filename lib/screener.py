@@ -0,0 +1,163 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from . import ticker_groups
+from .ticker import Ticker
+from .utils import helper, tracing
+
+
+SCREEN_COLUMNS = [
+    "Code",
+    "Annualized Return",
+    "Volatility",
+    "Tail df",
+    "Lag 1 AC",
+    "Lag 1 Abs AC",
+    "Max Abs AC",
+    "Sharpe Ratio",
+    "Error",
+]
+
+
+def get_group(name: str) -> tuple[list[str], bool]:
+    """
+    Codes of a group in ticker_groups, e.g. "OIL_AND_GAS", and whether it is an ASX group (named AUS_*).
+    """
+    codes = getattr(ticker_groups, name.upper(), None)
+    if not isinstance(codes, list):
+        raise KeyError(f"Unknown ticker group {name}")
+    return list(codes), name.upper().startswith("AUS_")
+
+
+def screen_ticker(ticker: Ticker, risk_free_rate: float, max_lag=20) -> dict:
+    """Summary statistics of a fitted ticker as a screener row"""
+    annualized_return = ticker.get_estimated_annualized_returns()
+    volatility = ticker.get_estimated_annualized_volatility()
+
+    # Lags run from 0 to max_lag, and lag 0 is the series with itself
+    correlations = ticker.calculate_autocorrelation(max_lag=max_lag).iloc[1:]
+
+    return {
+        "Code": ticker.code,
+        "Annualized Return": annualized_return,
+        "Volatility": volatility,
+        "Tail df": ticker.dist.df,
+        "Lag 1 AC": correlations["Directional"].iloc[0],
+        "Lag 1 Abs AC": correlations["Non-Directional"].iloc[0],
+        "Max Abs AC": np.nanmax(np.abs(correlations["Directional"].values)),
+        "Sharpe Ratio": helper.calculate_sharpe_ratio(
+            annualized_return, volatility, risk_free_rate
+        ),
+        "Error": None,
+    }
+
+
+def iter_screen(
+    codes: list[str],
+    years: int,
+    asx=True,
+    max_workers=8,
+    max_lag=20,
+    risk_free_rate=None,
+    provider=None,
+):
+    """
+    Load, fit and summarise tickers concurrently, yielding a row dict for each as soon as it finishes.
+
+    Rows are yielded in order of completion. A ticker that fails to load or fit yields a row with only
+    its code and the error message, so one bad symbol never stops the screen.
+    """
+    if risk_free_rate is None:
+        risk_free_rate = helper.get_risk_free_rate()
+
+    def load(code):
+        ticker = Ticker(code, years=years, asx=asx, fit_dists=False, provider=provider)
+        if len(ticker.closes) < 3:
+            raise ValueError(f"Not enough price history for {ticker.symbol}")
+
+        ticker.fit_dists()
+        return screen_ticker(ticker, risk_free_rate, max_lag=max_lag)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        load = tracing.propagate(load)
+        futures = {pool.submit(load, code): code for code in codes}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                tracing.count("screener.failed")
+                yield {"Code": futures[future], "Error": f"{type(e).__name__}: {e}"}
+
+
+@tracing.traced()
+def screen(
+    codes: list[str],
+    years: int,
+    asx=True,
+    max_workers=8,
+    max_lag=20,
+    risk_free_rate=None,
+    provider=None,
+    on_row=None,
+) -> pd.DataFrame:
+    """
+    Screen a list of tickers into one table with a row per code, in the order of codes.
+
+    on_row, if given, is called with each row dict as it finishes, see iter_screen.
+    """
+    rows = {}
+    for row in iter_screen(
+        codes,
+        years,
+        asx=asx,
+        max_workers=max_workers,
+        max_lag=max_lag,
+        risk_free_rate=risk_free_rate,
+        provider=provider,
+    ):
+        rows[row["Code"]] = row
+        if on_row is not None:
+            on_row(row)
+
+    df = pd.DataFrame([rows[code] for code in codes if code in rows], columns=SCREEN_COLUMNS)
+    return df.set_index("Code")
+
+
+def screen_group(name: str, years: int, **kwargs) -> pd.DataFrame:
+    """Screen a group from ticker_groups by name, see screen"""
+    codes, asx = get_group(name)
+    return screen(codes, years, asx=asx, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screen a ticker group or list of codes")
+    parser.add_argument("codes", nargs="+", help="A group name from ticker_groups, or ticker codes")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--asx", action="store_true", help="Codes are ASX listed")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    if len(args.codes) == 1 and hasattr(ticker_groups, args.codes[0].upper()):
+        codes, asx = get_group(args.codes[0])
+    else:
+        codes, asx = args.codes, args.asx
+
+    def print_row(row):
+        if row["Error"]:
+            print(f"{row['Code']:<8} failed: {row['Error']}")
+        else:
+            print(
+                f"{row['Code']:<8} return {row['Annualized Return']:8.2%}  "
+                f"volatility {row['Volatility']:8.2%}  sharpe {row['Sharpe Ratio']:6.2f}"
+            )
+
+    df = screen(codes, args.years, asx=asx, max_workers=args.workers, on_row=print_row)
+    print()
+    print(df.sort_values("Sharpe Ratio", ascending=False).to_string())
+
+
+if __name__ == "__main__":
+    main()
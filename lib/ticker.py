@@ -1,100 +1,217 @@
 import pandas as pd
 import numpy as np
-import yfinance as yf
 import datetime as dt
 
-from .utils import fitting as fit, simulation as sim
+from .utils import cache, fitting as fit, providers, simulation as sim, tracing
 
 
 class Ticker:
     """
-    A stock price history from yahoo finance and associated statistical analysis.
+    A stock price history and associated statistical analysis.
 
     When constructed, the ticker price data is loaded and a distribution is fit to log returns over the chosen date period.
     The timeframe of data is a given number of years ago to now.
 
     If asx is True (Australian stock exchange), a ".AX" is appended to the ticker code.
+
+    Prices come from provider, defaulting to providers.get_default_provider() (yahoo finance unless changed).
+
+    Price history from remote providers is cached on disk per symbol, so later constructions only fetch bars newer than the cache.
+    Fitted distribution parameters are cached against a hash of the returns, so unchanged data is never refit.
+    Set use_cache to False to always fetch the full history and refit.
+
+    Set fit_dists to False to only load the price data, fit_dists() must then be called before any analysis.
+
+    Only closing prices are kept, as a contiguous array of dtype (np.float32 halves memory) alongside a datetime64
+    array of dates. The df attribute rebuilds a dataframe with a Close column from them for compatibility.
     """
 
-    def __init__(self, code: str, years: int, asx=True):
+    @tracing.traced()
+    def __init__(
+        self,
+        code: str,
+        years: int,
+        asx=True,
+        use_cache=True,
+        fit_dists=True,
+        provider=None,
+        dtype=np.float64,
+    ):
         self.code = code
 
         if asx:
             code += ".AX"
 
+        self.symbol = code
+        self.years = years
+        self.use_cache = use_cache
         self.start_date = dt.datetime.today() - dt.timedelta(days=int(365 * years))
-        self.yticker = yf.Ticker(ticker=code)
-        self.df = self.build_ticker_df()
+        self.provider = provider or providers.get_default_provider()
+        self.dtype = dtype
+        self.set_prices(self.build_ticker_df())
+
+        if fit_dists:
+            self.fit_dists()
+
+    def fit_dists(self):
         self.dist = self.fit_log_returns_dist()
-        self.annualized_dist = self.fit_annualized_return_dist()
 
+    @property
+    def dist(self):
+        """Students T distribution of daily log returns"""
+        return self._dist
+
+    @dist.setter
+    def dist(self, dist):
+        self._dist = dist
+        self._annual_dist = None
+
+    @tracing.traced()
     def build_ticker_df(self):
-        df = self.yticker.history(
-            start=self.start_date, end=dt.datetime.today(), interval="1d"
+        return cache.load_price_history(
+            self.symbol,
+            start=self.start_date,
+            end=dt.datetime.today(),
+            fetch=self.fetch_history,
+            use_cache=self.use_cache and self.provider.cache_prices,
         )
 
-        # Convert timestamp to standard timezone naive datetime
-        df.index = df.index.to_pydatetime()
-        df.index = df.index.tz_localize(None)
+    def set_prices(self, df: pd.DataFrame):
+        """Store the closing prices of a price history, discarding the other columns"""
+        self.dates = df.index.values.astype("datetime64[ns]")
+        self.closes = np.ascontiguousarray(df["Close"].to_numpy(dtype=self.dtype))
+        self._log_returns = None
+        self._annual_dist = None
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self.get_close_prices().to_frame()
 
-        return df
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        self.set_prices(df)
+
+    def fetch_history(self, start: dt.datetime, end: dt.datetime):
+        """Fetch daily price history from the provider between two dates"""
+        return self.provider.get_history(self.symbol, start, end)
 
     def get_company_name(self):
-        return self.yticker.info.get("longName")
+        return self.provider.get_info(self.symbol).get("longName")
 
     def get_current_price(self):
-        return self.df["Close"].iloc[-1]
+        return self.closes[-1]
+
+    def get_close_prices(self) -> pd.Series:
+        return pd.Series(self.closes, index=pd.DatetimeIndex(self.dates), name="Close")
 
     def get_log_returns(self):
         """
-        Return a dataframe of log returns based on daily closing price
+        Return a series of log returns based on daily closing price, computed once and cached
         """
-        returns_data = np.log(self.df["Close"] / self.df["Close"].shift(1))
-        returns_data = returns_data.dropna()
-        return returns_data
-
+        if self._log_returns is None:
+            returns_data = np.log(self.closes[1:] / self.closes[:-1])
+            valid = ~np.isnan(returns_data)
+            self._log_returns = pd.Series(
+                returns_data[valid], index=pd.DatetimeIndex(self.dates[1:][valid]), name="Close"
+            )
+        return self._log_returns
+
+    def get_fit_cache_key(self) -> str:
+        return cache.fit_cache_key(self.symbol, self.years, self.get_log_returns().values)
+
+    @tracing.traced()
     def fit_log_returns_dist(self):
         """
         Fits a students T distribution to the log returns data
         """
         returns_data = self.get_log_returns()
-        return fit.fit_student_t(returns_data)
+        if not self.use_cache:
+            return fit.fit_student_t(returns_data)
+
+        key = self.get_fit_cache_key()
+        params = cache.read_fit_params(key, "daily")
+        if params is None:
+            params = fit.fit_student_t(returns_data)
+            cache.write_fit_params(key, "daily", params)
+
+        return fit.StudentT(*params)
 
+    @tracing.traced()
     def calculate_autocorrelation(self, max_lag=60) -> pd.DataFrame:
         log_returns = self.get_log_returns()
         correlations = sim.calculate_lag_correlations(log_returns, max_lag=max_lag)
         return correlations
 
     def get_estimated_annualized_returns(self):
-        return self.dist.kwds["loc"] * 252
+        return self.dist.loc * 252
 
     def get_estimated_annualized_volatility(self):
-        nu = self.dist.kwds["df"]
-        sigma = self.dist.kwds["scale"]
+        nu = self.dist.df
+        sigma = self.dist.scale
         daily_volatility = np.sqrt((nu / (nu - 2)) * sigma**2)
         return daily_volatility * np.sqrt(252)
 
-    def fit_annualized_return_dist(self):
-        samples = self.dist.rvs(size=(252, 10_000))
-        annualized_samples = np.sum(samples, axis=0)
-        dist = fit.fit_student_t(annualized_samples)
-        return dist
+    @tracing.traced()
+    def fit_annualized_return_dist(self, flush=True):
+        """
+        Fit the distribution of returns summed over a year.
+
+        Set flush to False when fitting many tickers, then call cache.flush_fit_cache once afterwards.
+        """
+        if not self.use_cache:
+            return fit.fit_annualized_student_t(self.dist)
 
-    def get_annualized_return_dist(self):
-        return self.annualized_dist
+        key = self.get_fit_cache_key()
+        params = cache.read_fit_params(key, "annual")
+        if params is None:
+            params = fit.fit_annualized_student_t(self.dist)
+            cache.write_fit_params(key, "annual", params, flush=flush)
 
-    def simulate_returns(self, days: int, starting_balance: float, sims=1000):
+        return fit.StudentT(*params)
+
+    def get_annualized_return_dist(self, flush=True):
+        """
+        Distribution of returns summed over a year, fitted on first access and memoized until dist or the prices change
+        """
+        if self._annual_dist is None:
+            self._annual_dist = self.fit_annualized_return_dist(flush=flush)
+        return self._annual_dist
+
+    @tracing.traced()
+    def simulate_returns(
+        self,
+        days: int,
+        starting_balance: float,
+        sims=1000,
+        rng=None,
+        dtype=np.float64,
+        output="balance",
+    ):
         """
         Simulate returns for a given number of days from a starting balance
 
-        Returns an array of daily balances of shape (sims, days).
+        rng is a numpy Generator or seed, pass one for reproducible runs.
+        dtype sets the precision of the simulation, np.float32 halves memory use.
+        output selects the result:
+            "balance": array of daily balances of shape (sims, days)
+            "log_balance": array of the log of daily balances of shape (sims, days)
+            "terminal": array of final balances of shape (sims,)
         """
+        if output not in ("balance", "log_balance", "terminal"):
+            raise ValueError(f"Unknown simulation output: {output}")
+
+        rng = np.random.default_rng(rng)
+        log_returns = sim.simulate_t_samples(
+            rng, self.dist.df, self.dist.loc, self.dist.scale, size=(sims, days), dtype=dtype
+        )
 
-        log_returns = np.zeros((days, sims))
-        for i in range(days):
-            log_returns[i, :] = self.dist.rvs(size=sims)
+        if output == "terminal":
+            return starting_balance * np.exp(log_returns.sum(axis=1))
 
-        cum_returns = np.cumsum(log_returns, axis=0)
-        balance = starting_balance * np.exp(cum_returns.T)
+        cum_returns = np.cumsum(log_returns, axis=1, out=log_returns)
+        if output == "log_balance":
+            return cum_returns + np.log(starting_balance).astype(dtype)
 
+        balance = np.exp(cum_returns, out=cum_returns)
+        balance *= starting_balance
         return balance
@@ -0,0 +1,250 @@
+import datetime as dt
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from . import providers, tracing
+
+
+CACHE_DIR = Path(os.environ.get("FINANCE_CACHE_DIR", Path.home() / ".cache" / "finance"))
+
+# Cached history younger than this is served without asking the data source for new bars
+PRICE_REFRESH_AGE = dt.timedelta(hours=1)
+
+# Fitted parameters older than this, or beyond this many entries (oldest first), are evicted
+FIT_CACHE_MAX_AGE = dt.timedelta(days=30)
+FIT_CACHE_MAX_ENTRIES = 2000
+
+_fit_cache_lock = threading.Lock()
+
+
+def get_cache_dir(*parts: str) -> Path:
+    """Return (and create) a directory inside the local cache."""
+    path = CACHE_DIR.joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _price_history_path(symbol: str, interval: str) -> Path:
+    safe_symbol = symbol.replace("/", "_").replace("\\", "_")
+    return get_cache_dir("prices") / f"{safe_symbol}_{interval}.npz"
+
+
+def write_atomic(path: Path, write: Callable):
+    """Write a file through write(f) atomically so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _write_npz(path: Path, **arrays):
+    write_atomic(path, lambda f: np.savez(f, **arrays))
+
+
+def read_price_history(symbol: str, interval="1d"):
+    """
+    Read a cached price history.
+
+    Returns a tuple of (df, covered_from, fetched_at), or None if nothing usable is cached.
+    """
+    path = _price_history_path(symbol, interval)
+    if not path.exists():
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            index = pd.DatetimeIndex(data["index"].astype("datetime64[ns]"))
+            df = pd.DataFrame(data["values"], index=index, columns=data["columns"].tolist())
+            covered_from = pd.Timestamp(int(data["covered_from"]))
+            fetched_at = pd.Timestamp(int(data["fetched_at"]))
+    except (OSError, KeyError, ValueError):
+        # Corrupt or outdated cache file, treat as a cold start
+        return None
+
+    return df, covered_from, fetched_at
+
+
+def write_price_history(
+    symbol: str, df: pd.DataFrame, covered_from: dt.datetime, interval="1d"
+):
+    """Store a price history, recording the start date its requested window covered."""
+    index = df.index.values.astype("datetime64[ns]").view("int64")
+    _write_npz(
+        _price_history_path(symbol, interval),
+        index=index,
+        columns=np.array(df.columns, dtype=str),
+        values=df.to_numpy(dtype=np.float64),
+        covered_from=np.int64(pd.Timestamp(covered_from).value),
+        fetched_at=np.int64(pd.Timestamp(dt.datetime.now()).value),
+    )
+
+
+def load_price_history(
+    symbol: str,
+    start: dt.datetime,
+    end: dt.datetime,
+    fetch: Callable[[dt.datetime, dt.datetime], pd.DataFrame],
+    interval="1d",
+    use_cache=True,
+) -> pd.DataFrame:
+    """
+    Load a price history for the window start to end, using the on-disk cache where possible.
+
+    fetch(start, end) must return a dataframe with a timezone naive datetime index.
+    Only bars after the last cached bar are fetched when the cache already covers the start date.
+    The last cached bar is always refetched, as it may have been an incomplete trading day.
+    If fetching the new bars fails, the cached history is returned as it is.
+    """
+    if not use_cache:
+        return fetch(start, end)
+
+    start = pd.Timestamp(start)
+    cached = read_price_history(symbol, interval)
+
+    if cached is None or cached[1] > start or cached[0].empty:
+        # Cold start, or the cache doesn't reach back far enough
+        tracing.count("price_cache.miss")
+        df = fetch(start, end)
+        if not df.empty:
+            write_price_history(symbol, df, covered_from=start, interval=interval)
+        return df
+
+    df, covered_from, fetched_at = cached
+    last_bar = df.index[-1]
+
+    if dt.datetime.now() - fetched_at > PRICE_REFRESH_AGE and last_bar.date() <= pd.Timestamp(end).date():
+        tracing.count("price_cache.refresh")
+        try:
+            new_df = fetch(last_bar.to_pydatetime(), end)
+        except providers.PROVIDER_ERRORS:
+            # A transient download error shouldn't fail a load the cache can serve
+            tracing.count("price_cache.refresh_failed")
+            return df[df.index >= start]
+
+        if not new_df.empty:
+            df = pd.concat([df[df.index < new_df.index[0]], new_df])
+        write_price_history(symbol, df, covered_from=covered_from, interval=interval)
+    else:
+        tracing.count("price_cache.hit")
+
+    return df[df.index >= start]
+
+
+def fit_cache_key(symbol: str, window, returns: np.ndarray) -> str:
+    """
+    Key for fitted parameters of a symbol's returns over a window.
+
+    Includes a hash of the returns, so the key changes (and old fits are unused) whenever new bars arrive.
+    """
+    digest = hashlib.sha1(np.ascontiguousarray(returns, dtype=np.float64).tobytes()).hexdigest()
+    return f"{symbol}|{window}|{digest}"
+
+
+def _fit_cache_path() -> Path:
+    return get_cache_dir() / "fits.json"
+
+
+def _read_fit_cache() -> dict:
+    try:
+        with open(_fit_cache_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Fitted parameters are read from disk once per cache directory and kept in memory.
+# Writes are held in memory as pending until flush_fit_cache merges them back into the file.
+_fit_cache = {"path": None, "entries": {}, "pending": {}}
+
+
+def _get_fit_entries() -> dict:
+    """In-process fit cache entries, loading them from disk the first time (call with the lock held)"""
+    path = _fit_cache_path()
+    if _fit_cache["path"] != path:
+        _fit_cache["path"] = path
+        _fit_cache["entries"] = _read_fit_cache()
+        _fit_cache["pending"] = {}
+    return _fit_cache["entries"]
+
+
+def read_fit_params(key: str, name: str):
+    """Return the cached parameter tuple stored under a key and name, or None."""
+    with _fit_cache_lock:
+        entry = _get_fit_entries().get(key)
+
+    if entry is None or name not in entry["params"]:
+        tracing.count("fit_cache.miss")
+        return None
+
+    created = dt.datetime.fromisoformat(entry["created"])
+    if dt.datetime.now() - created > FIT_CACHE_MAX_AGE:
+        tracing.count("fit_cache.miss")
+        return None
+
+    tracing.count("fit_cache.hit")
+    return tuple(entry["params"][name])
+
+
+def write_fit_params(key: str, name: str, params: tuple, flush=True) -> bool:
+    """
+    Store a parameter tuple under a key and name.
+
+    Non-finite parameters are never stored, returns whether the parameters were stored.
+    Set flush to False to only update the in-process cache when storing a batch, then call flush_fit_cache.
+    """
+    params = [float(p) for p in params]
+    if not np.all(np.isfinite(params)):
+        return False
+
+    with _fit_cache_lock:
+        entries = _get_fit_entries()
+        created = entries.get(key, {}).get("created", dt.datetime.now().isoformat())
+        entry = {"created": created, "params": {**entries.get(key, {}).get("params", {}), name: params}}
+        entries[key] = entry
+        _fit_cache["pending"][key] = entry
+
+    if flush:
+        flush_fit_cache()
+    return True
+
+
+def flush_fit_cache():
+    """Merge pending parameters into the file, evicting stale and excess entries."""
+    now = dt.datetime.now()
+
+    with _fit_cache_lock:
+        _get_fit_entries()
+        if not _fit_cache["pending"]:
+            return
+
+        # Re-read so entries written by other processes are kept
+        entries = _read_fit_cache()
+        for key, entry in _fit_cache["pending"].items():
+            params = {**entries.get(key, {}).get("params", {}), **entry["params"]}
+            entries[key] = {"created": entry["created"], "params": params}
+
+        entries = {
+            k: v
+            for k, v in entries.items()
+            if now - dt.datetime.fromisoformat(v["created"]) <= FIT_CACHE_MAX_AGE
+        }
+        if len(entries) > FIT_CACHE_MAX_ENTRIES:
+            newest = sorted(entries, key=lambda k: entries[k]["created"], reverse=True)
+            entries = {k: entries[k] for k in newest[:FIT_CACHE_MAX_ENTRIES]}
+
+        data = json.dumps(entries).encode()
+        write_atomic(_fit_cache_path(), lambda f: f.write(data))
+        _fit_cache["entries"] = entries
+        _fit_cache["pending"] = {}
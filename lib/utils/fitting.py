@@ -1,11 +1,195 @@
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+import scipy.special as special
 import scipy.stats as stats
 import pandas as pd
 
+from . import tracing
+
+
+class StudentT(NamedTuple):
+    """
+    Fitted parameters of a students T distribution.
+
+    Evaluates the distribution functions directly from the parameters, avoiding the overhead of a frozen
+    scipy distribution on every call.
+    """
+
+    df: float
+    loc: float
+    scale: float
+
+    def pdf(self, x):
+        return stats.t.pdf(x, self.df, loc=self.loc, scale=self.scale)
+
+    def cdf(self, x):
+        return special.stdtr(self.df, (np.asarray(x) - self.loc) / self.scale)
+
+    def ppf(self, q):
+        return special.stdtrit(self.df, q) * self.scale + self.loc
+
+    def rvs(self, size=None, random_state=None):
+        rng = np.random.default_rng(random_state) if random_state is not None else np.random
+        return rng.standard_t(self.df, size=size) * self.scale + self.loc
+
+    def mean(self):
+        return self.loc if self.df > 1 else np.nan
+
+    def median(self):
+        return self.loc
+
+    def std(self):
+        return self.scale * np.sqrt(self.df / (self.df - 2)) if self.df > 2 else np.inf
+
+
+# Bounds on the degrees of freedom searched by the batched fitter
+_MIN_DF = 0.3
+_MAX_DF = 1e6
+
+# Relative to the starting scale. Data with a point mass (mostly zero returns) drives the scale towards zero,
+# columns reaching this floor stop there instead of iterating until they underflow
+_MIN_SCALE_RATIO = 1e-8
+
+
+def _student_t_df_derivatives(nu, d, mask, n):
+    """First and second derivatives of the T log-likelihood in nu for standardized squared residuals d."""
+    nu_d = nu + d
+    s1 = np.sum(np.log1p(d / nu) * mask, axis=0)
+    s2 = np.sum((1 / nu - 1 / nu_d) * mask, axis=0)
+    s3 = np.sum((1 / nu_d**2 - 1 / nu**2) * mask, axis=0)
+
+    grad = (
+        n / 2 * (special.digamma((nu + 1) / 2) - special.digamma(nu / 2) - 1 / nu)
+        - s1 / 2
+        + (nu + 1) / 2 * s2
+    )
+    hess = (
+        n / 4 * (special.polygamma(1, (nu + 1) / 2) - special.polygamma(1, nu / 2))
+        + n / (2 * nu**2)
+        + s2
+        + (nu + 1) / 2 * s3
+    )
+    return grad, hess
+
+
+@tracing.traced()
+def fit_student_t_batch(data, max_iter=500, tol=1e-9) -> list[StudentT]:
+    """
+    Maximum likelihood fit of a students T distribution to every column of a 2D array.
+
+    data has shape (observations, series), missing observations may be NaN.
+    Starts from moment based guesses, then alternates EM updates of loc and scale with Newton steps on the
+    degrees of freedom. Columns stop updating as soon as they converge.
+    Columns the batch can't fit to finite parameters are refit with scipy, and a ValueError is raised if
+    that fails too. Returns one StudentT per column.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim == 1:
+        data = data[:, None]
+
+    mask = ~np.isnan(data)
+    x = np.where(mask, data, 0.0)
+    n = mask.sum(axis=0)
+
+    # Moment based starting guesses: median and MAD for location and scale, kurtosis for the tails
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loc = np.nanmedian(data, axis=0)
+        centred = np.where(mask, x - loc, 0.0)
+        variance = np.sum(centred**2, axis=0) / n
+        excess_kurtosis = np.sum(centred**4, axis=0) / n / variance**2 - 3
+        nu = np.where(excess_kurtosis > 0, 4 + 6 / np.maximum(excess_kurtosis, 1e-12), 30.0)
+        nu = np.clip(np.nan_to_num(nu, nan=30.0), 2.5, 100.0)
+        mad = np.nanmedian(np.abs(data - loc), axis=0)
+
+    # MAD is zero when most returns are identical (e.g. illiquid names), start from the deviation instead
+    scale = np.where(mad > 0, mad / special.stdtrit(nu, 0.75), np.sqrt(variance * (nu - 2) / nu))
+
+    min_scale = scale * _MIN_SCALE_RATIO
+    active = np.flatnonzero(np.isfinite(loc) & (scale > 0))
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+
+        xa, ma, na = x[:, active], mask[:, active], n[active]
+        la, sa, nua = loc[active], scale[active], nu[active]
+
+        # E step weights and M step for location and scale with nu fixed
+        d = np.where(ma, (xa - la) ** 2, 0.0) / sa**2
+        w = (nua + 1) / (nua + d) * ma
+        new_loc = np.sum(w * xa, axis=0) / np.sum(w, axis=0)
+        new_scale = np.sqrt(np.sum(w * np.where(ma, xa - new_loc, 0.0) ** 2, axis=0) / na)
+
+        # Newton step on log(nu) against the full likelihood
+        d = np.where(ma, (xa - new_loc) ** 2, 0.0) / new_scale**2
+        grad, hess = _student_t_df_derivatives(nua, d, ma, na)
+        log_grad = nua * grad
+        log_hess = nua**2 * hess + log_grad
+        step = np.where(log_hess < 0, -log_grad / np.where(log_hess < 0, log_hess, -1), np.sign(log_grad))
+        new_nu = np.clip(nua * np.exp(np.clip(step, -1, 1)), _MIN_DF, _MAX_DF)
+
+        finite = np.isfinite(new_loc) & np.isfinite(new_scale) & np.isfinite(new_nu) & (new_scale > 0)
+        collapsed = new_scale <= min_scale[active]
+        new_scale = np.maximum(new_scale, min_scale[active])
+        converged = collapsed | (
+            (np.abs(new_loc - la) <= tol * new_scale)
+            & (np.abs(new_scale - sa) <= tol * new_scale)
+            & (np.abs(new_nu - nua) <= tol * new_nu * 100)
+        )
+
+        # Columns that broke down keep their last finite values and are checked below
+        update = active[finite]
+        loc[update], scale[update], nu[update] = new_loc[finite], new_scale[finite], new_nu[finite]
+        active = active[finite & ~converged]
+
+    dists = []
+    for i, params in enumerate(zip(nu, loc, scale)):
+        if not (np.all(np.isfinite(params)) and params[2] > 0):
+            params = stats.t.fit(data[mask[:, i], i])
+            if not (np.all(np.isfinite(params)) and params[2] > 0):
+                raise ValueError(f"Could not fit a students T distribution to column {i}")
+        dists.append(StudentT(*(float(p) for p in params)))
+    return dists
+
+
+@tracing.traced()
+def fit_student_t(data: pd.Series) -> StudentT:
+    return fit_student_t_batch(np.asarray(data, dtype=np.float64))[0]
+
+
+@tracing.traced()
+def fit_annualized_student_t(daily_dist, periods=252, sims=2_000):
+    """
+    Fits a students T distribution to returns summed over a number of periods of a daily distribution
+
+    The result is memoized per set of daily parameters.
+    """
+    return _fit_annualized_student_t(
+        float(daily_dist.df), float(daily_dist.loc), float(daily_dist.scale), periods, sims
+    )
+
+
+@lru_cache(maxsize=1024)
+def _fit_annualized_student_t(nu, loc, scale, periods, sims):
+    if nu > 4:
+        # Match the mean, variance and kurtosis of the sum of independent T variables.
+        # Excess kurtosis of the sum is 6 / (nu - 4) / periods, which a T with these degrees of freedom matches.
+        annual_nu = 4 + periods * (nu - 4)
+        annual_variance = periods * scale**2 * nu / (nu - 2)
+        annual_scale = np.sqrt(annual_variance * (annual_nu - 2) / annual_nu)
+        return StudentT(annual_nu, periods * loc, float(annual_scale))
+
+    # Heavy tails without a finite kurtosis, fit a small seeded sample of sums instead
+    rng = np.random.default_rng(0)
+    samples = stats.t.rvs(nu, size=(periods, sims), random_state=rng) * scale + loc
+    annualized_samples = np.sum(samples, axis=0)
 
-def fit_student_t(data: pd.Series):
-    nu, loc, scale = stats.t.fit(data)
-    t_dist = stats.t(df=nu, loc=loc, scale=scale)
-    return t_dist
+    q25, q50, q75 = np.percentile(annualized_samples, [25, 50, 75])
+    annual_nu, annual_loc, annual_scale = stats.t.fit(
+        annualized_samples, nu * 2, loc=q50, scale=(q75 - q25) / 2
+    )
+    return StudentT(float(annual_nu), float(annual_loc), float(annual_scale))
 
 
 def fit_normal(data: pd.Series):
@@ -1,7 +1,25 @@
+import datetime as dt
+import json
+import threading
+
 import numpy as np
-import yfinance as yf
 from prettytable import PrettyTable
 
+from . import cache, providers
+
+
+# How long a downloaded risk free rate is reused before it is refreshed
+RISK_FREE_RATE_MAX_AGE = dt.timedelta(hours=12)
+
+# Used when the rate can't be downloaded and no previous value is known
+DEFAULT_RISK_FREE_RATE = 0.04
+
+# How long to wait after a failed download before trying again
+RISK_FREE_RATE_RETRY_DELAY = dt.timedelta(minutes=5)
+
+_risk_free_rate = {"rate": None, "fetched_at": None, "failed_at": None, "refreshing": False}
+_risk_free_rate_lock = threading.Lock()
+
 
 def print_correlation_matrix(corr_matrix):
     """
@@ -27,22 +45,133 @@ def print_correlation_matrix(corr_matrix):
     print(table)
 
 
-def calculate_percentiles(data, axis=0, confidence=95):
-    percentiles = [(50 - confidence / 2), 50, (50 + confidence / 2)]
-    return np.percentile(data, q=percentiles, axis=axis)
+def get_confidence_percentiles(confidences) -> list[float]:
+    """
+    Lower and upper percentiles for each confidence level followed by the median.
+
+    e.g. (95, 50) gives [2.5, 97.5, 25, 75, 50]
+    """
+    percentiles = []
+    for confidence in confidences:
+        percentiles += [(50 - confidence / 2), (50 + confidence / 2)]
+    return percentiles + [50]
+
+
+def split_percentile_bands(values, confidences) -> tuple[dict, np.ndarray]:
+    """
+    Split percentiles ordered as by get_confidence_percentiles into ({confidence: (low, high)}, median)
+    """
+    bands = {
+        confidence: (values[2 * i], values[2 * i + 1])
+        for i, confidence in enumerate(confidences)
+    }
+    return bands, values[-1]
+
+
+def calculate_percentile_bands(data, confidences=(95, 50), axis=0) -> tuple[dict, np.ndarray]:
+    """
+    Percentile bands for several confidence levels from a single pass over the data.
+
+    Returns ({confidence: (low, high)}, median)
+    """
+    percentiles = get_confidence_percentiles(confidences)
+    values = np.percentile(data, q=percentiles, axis=axis)
+    return split_percentile_bands(values, confidences)
 
 
-def calculate_risk_free_rate():
+def calculate_risk_free_rate(provider=None):
     """Estimate a risk free rate of return using 13 week US treasury bonds"""
-    data = yf.download("^IRX")
-    current_yield = data["Close"].iloc[-1]
+    provider = provider or providers.get_default_provider()
+    end = dt.datetime.today() + dt.timedelta(days=1)
+    data = provider.get_history("^IRX", start=end - dt.timedelta(days=8), end=end)
+    current_yield = float(data["Close"].iloc[-1])
+    if not np.isfinite(current_yield):
+        raise ValueError(f"Invalid treasury yield: {current_yield}")
     return current_yield / 100
 
 
+def _risk_free_rate_path():
+    return cache.get_cache_dir() / "risk_free_rate.json"
+
+
+def _read_persisted_risk_free_rate():
+    try:
+        with open(_risk_free_rate_path()) as f:
+            data = json.load(f)
+        return float(data["rate"]), dt.datetime.fromisoformat(data["fetched_at"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _persist_risk_free_rate(rate: float, fetched_at: dt.datetime):
+    data = json.dumps({"rate": rate, "fetched_at": fetched_at.isoformat()}).encode()
+    try:
+        cache.write_atomic(_risk_free_rate_path(), lambda f: f.write(data))
+    except OSError:
+        pass
+
+
+def get_risk_free_rate(max_age=RISK_FREE_RATE_MAX_AGE, persist=True) -> float:
+    """
+    Return the risk free rate, downloading it only when no value younger than max_age is known.
+
+    The rate is cached in-process and, if persist is True, on disk so new sessions can start from the last known value.
+    If the download fails the last known value is used, or DEFAULT_RISK_FREE_RATE if there is none, and the
+    download is not retried until RISK_FREE_RATE_RETRY_DELAY has passed.
+
+    The download runs without holding the lock. While one caller refreshes a stale rate, other callers are
+    served the stale rate instead of waiting.
+    """
+    with _risk_free_rate_lock:
+        if _risk_free_rate["rate"] is None and persist:
+            persisted = _read_persisted_risk_free_rate()
+            if persisted is not None:
+                _risk_free_rate["rate"], _risk_free_rate["fetched_at"] = persisted
+
+        rate = _risk_free_rate["rate"]
+        fetched_at = _risk_free_rate["fetched_at"]
+        failed_at = _risk_free_rate["failed_at"]
+        now = dt.datetime.now()
+
+        stale = rate is None or now - fetched_at > max_age
+        backing_off = failed_at is not None and now - failed_at < RISK_FREE_RATE_RETRY_DELAY
+        refreshing = rate is not None and _risk_free_rate["refreshing"]
+        if not stale or backing_off or refreshing:
+            return DEFAULT_RISK_FREE_RATE if rate is None else rate
+        _risk_free_rate["refreshing"] = True
+
+    try:
+        rate = calculate_risk_free_rate()
+    except providers.PROVIDER_ERRORS:
+        with _risk_free_rate_lock:
+            _risk_free_rate["failed_at"] = now
+            _risk_free_rate["refreshing"] = False
+            rate = _risk_free_rate["rate"]
+        return DEFAULT_RISK_FREE_RATE if rate is None else rate
+    except BaseException:
+        with _risk_free_rate_lock:
+            _risk_free_rate["refreshing"] = False
+        raise
+
+    fetched_at = dt.datetime.now()
+    with _risk_free_rate_lock:
+        _risk_free_rate["rate"] = rate
+        _risk_free_rate["fetched_at"] = fetched_at
+        _risk_free_rate["failed_at"] = None
+        _risk_free_rate["refreshing"] = False
+
+    if persist:
+        _persist_risk_free_rate(rate, fetched_at)
+    return rate
+
+
 def calculate_sharpe_ratio(
     expected_returns: np.ndarray,
     volatility: np.ndarray,
-    risk_free_rate=calculate_risk_free_rate(),
+    risk_free_rate=None,
 ) -> np.ndarray:
+    if risk_free_rate is None:
+        risk_free_rate = get_risk_free_rate()
+
     excess_returns = expected_returns - risk_free_rate
     return excess_returns / volatility
@@ -0,0 +1,107 @@
+import warnings
+
+import numpy as np
+import scipy.optimize as optimize
+
+
+def _solve(objective, num_securities, constraints, x0=None) -> np.ndarray:
+    """
+    Minimize an objective over long-only weights that sum to one.
+
+    Raises a ValueError if the solver doesn't converge.
+    """
+    if x0 is None:
+        x0 = np.full(num_securities, 1 / num_securities)
+
+    constraints = [
+        {"type": "eq", "fun": lambda w: np.sum(w) - 1, "jac": lambda w: np.ones_like(w)}
+    ] + constraints
+
+    result = optimize.minimize(
+        objective,
+        x0,
+        jac=True,
+        method="SLSQP",
+        bounds=[(0, 1)] * num_securities,
+        constraints=constraints,
+        options={"maxiter": 500, "ftol": 1e-12},
+    )
+
+    if not result.success:
+        raise ValueError(f"Portfolio optimization failed: {result.message}")
+
+    # Clean up solver noise around the bounds
+    weights = np.clip(result.x, 0, 1)
+    return weights / weights.sum()
+
+
+def _variance(cov_matrix):
+    def objective(w):
+        cov_w = cov_matrix @ w
+        return w @ cov_w, 2 * cov_w
+
+    return objective
+
+
+def minimum_variance_weights(cov_matrix, returns=None, target_return=None, x0=None) -> np.ndarray:
+    """
+    Long-only weights with the lowest variance, optionally constrained to a target expected return.
+    """
+    cov_matrix = np.asarray(cov_matrix)
+    constraints = []
+    if target_return is not None:
+        returns = np.asarray(returns)
+        constraints.append(
+            {
+                "type": "eq",
+                "fun": lambda w: w @ returns - target_return,
+                "jac": lambda w: returns,
+            }
+        )
+
+    return _solve(_variance(cov_matrix), len(cov_matrix), constraints, x0=x0)
+
+
+def max_sharpe_weights(returns, cov_matrix, risk_free_rate: float, x0=None) -> np.ndarray:
+    """Long-only weights with the highest Sharpe ratio."""
+    returns = np.asarray(returns)
+    cov_matrix = np.asarray(cov_matrix)
+
+    def objective(w):
+        cov_w = cov_matrix @ w
+        volatility = np.sqrt(w @ cov_w)
+        excess = w @ returns - risk_free_rate
+        sharpe = excess / volatility
+        grad = (returns * volatility - excess * cov_w / volatility) / volatility**2
+        return -sharpe, -grad
+
+    return _solve(objective, len(returns), [], x0=x0)
+
+
+def efficient_frontier(returns, cov_matrix, points=50) -> np.ndarray:
+    """
+    Weights of long-only portfolios along the efficient frontier.
+
+    Solves for the minimum variance portfolio at evenly spaced target returns, from the return of the
+    global minimum variance portfolio up to the highest single security return.
+    Target returns the solver fails on are skipped with a warning.
+
+    Returns an array of shape (up to points, num_securities)
+    """
+    returns = np.asarray(returns)
+    cov_matrix = np.asarray(cov_matrix)
+
+    min_variance = minimum_variance_weights(cov_matrix)
+    targets = np.linspace(min_variance @ returns, returns.max(), points)
+
+    weights = [min_variance]
+    for target in targets[1:]:
+        # Warm start each solve from the previous point on the frontier
+        try:
+            weights.append(
+                minimum_variance_weights(cov_matrix, returns, target_return=target, x0=weights[-1])
+            )
+        except ValueError as e:
+            warnings.warn(f"Skipping efficient frontier point at return {target:.4f}: {e}", RuntimeWarning)
+
+    return np.array(weights)
@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+from . import simulation as sim
+
+
+# How days on which only some series have a return are treated by the statistics:
+#   "pairwise": each pair of series uses the days both have returns, matching DataFrame.corr and cov
+#   "complete": only days on which every series has a return are used
+#   "zero": missing returns count as zero, as if the price was unchanged
+MISSING_POLICIES = ("pairwise", "complete", "zero")
+
+
+def _pairwise_moments(values: np.ndarray, new: np.ndarray = None):
+    """
+    Pairwise complete covariances and correlations between the columns of values and the columns of new
+    (or values itself), as computed by DataFrame.cov and DataFrame.corr with NaN for missing data.
+
+    Returns (cov, corr) of shape (values columns, new columns)
+    """
+    if new is None:
+        new = values
+
+    # Centring first keeps the sums of products well conditioned
+    values = values - np.nanmean(values, axis=0)
+    new = new - np.nanmean(new, axis=0)
+
+    mask = np.isfinite(values).astype(np.float64)
+    new_mask = np.isfinite(new).astype(np.float64)
+    x = np.where(mask > 0, values, 0.0)
+    y = np.where(new_mask > 0, new, 0.0)
+
+    # Counts, sums and sums of squares of each series over the days shared with each other series
+    n = mask.T @ new_mask
+    sum_x = x.T @ new_mask
+    sum_y = mask.T @ y
+    square_x = (x * x).T @ new_mask
+    square_y = mask.T @ (y * y)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cross = x.T @ y - sum_x * sum_y / n
+        cov = cross / (n - 1)
+        corr = cross / np.sqrt((square_x - sum_x**2 / n) * (square_y - sum_y**2 / n))
+
+    cov[n < 2] = np.nan
+    corr[n < 2] = np.nan
+    return cov, np.clip(corr, -1, 1)
+
+
+class ReturnsPanel:
+    """
+    Log returns of several series aligned on the union of their dates, as a (days, series) array.
+
+    Days on which a series has no return (e.g. different exchange holidays) are NaN in values, and handled
+    by the statistics according to missing, one of MISSING_POLICIES.
+
+    The mean, covariance, correlation and Cholesky factor of the correlation matrix are computed once and cached.
+    Adding or removing a series keeps the cache where possible: with the pairwise policy the statistics of
+    the other series are unchanged, so only the new row and column are computed.
+    """
+
+    def __init__(self, series: dict[str, pd.Series], missing="pairwise"):
+        if missing not in MISSING_POLICIES:
+            raise ValueError(f"Unknown missing data policy: {missing}")
+
+        self.missing = missing
+        self.codes = list(series)
+
+        indexes = [s.index.values.astype("datetime64[ns]") for s in series.values()]
+        self.dates = np.unique(np.concatenate(indexes)) if indexes else np.array([], "datetime64[ns]")
+        self.values = np.full((len(self.dates), len(self.codes)), np.nan)
+        for i, (index, s) in enumerate(zip(indexes, series.values())):
+            self.values[np.searchsorted(self.dates, index), i] = s.to_numpy(dtype=np.float64)
+
+        self._stats = {}
+
+    def copy(self) -> "ReturnsPanel":
+        """Copy sharing the data, which is replaced rather than modified when the panel changes"""
+        other = ReturnsPanel.__new__(ReturnsPanel)
+        other.missing = self.missing
+        other.codes = list(self.codes)
+        other.dates = self.dates
+        other.values = self.values
+        other._stats = dict(self._stats)
+        return other
+
+    def to_df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values, index=pd.DatetimeIndex(self.dates), columns=self.codes)
+
+    def get_values(self) -> np.ndarray:
+        """Returns with the missing data policy applied, NaN remains only under the pairwise policy"""
+        if self.missing == "complete":
+            return self.values[np.isfinite(self.values).all(axis=1)]
+        if self.missing == "zero":
+            return np.nan_to_num(self.values, nan=0.0)
+        return self.values
+
+    def _get(self, name: str, compute):
+        if name not in self._stats:
+            self._stats[name] = compute()
+        return self._stats[name]
+
+    def get_mean(self) -> np.ndarray:
+        return self._get("mean", lambda: np.nanmean(self.get_values(), axis=0))
+
+    def _compute_moments(self):
+        values = self.get_values()
+        if self.missing == "pairwise":
+            cov, corr = _pairwise_moments(values)
+        else:
+            cov = np.atleast_2d(np.cov(values, rowvar=False))
+            std = np.sqrt(np.diag(cov))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                corr = np.clip(cov / np.outer(std, std), -1, 1)
+
+        np.fill_diagonal(corr, 1.0)
+        self._stats["cov"] = cov
+        self._stats["corr"] = corr
+
+    def get_cov(self) -> np.ndarray:
+        if "cov" not in self._stats:
+            self._compute_moments()
+        return self._stats["cov"]
+
+    def get_corr(self) -> np.ndarray:
+        if "corr" not in self._stats:
+            self._compute_moments()
+        return self._stats["corr"]
+
+    def get_corr_cholesky(self) -> np.ndarray:
+        """Cholesky factor of the correlation matrix, see simulation.cholesky_factor"""
+        return self._get("cholesky", lambda: sim.cholesky_factor(self.get_corr()))
+
+    def add(self, code: str, series: pd.Series):
+        """Add a series as the last column, extending the dates to cover it"""
+        index = series.index.values.astype("datetime64[ns]")
+        dates = np.union1d(self.dates, index)
+
+        values = np.full((len(dates), len(self.codes) + 1), np.nan)
+        values[np.searchsorted(dates, self.dates), :-1] = self.values
+        values[np.searchsorted(dates, index), -1] = series.to_numpy(dtype=np.float64)
+
+        stats = self._stats
+        self.codes = self.codes + [code]
+        self.dates = dates
+        self.values = values
+        self._stats = {}
+
+        # Other series are unaffected by the new dates under the pairwise policy, so extend their statistics
+        if self.missing != "pairwise" or "cov" not in stats:
+            return
+
+        cov_row, corr_row = _pairwise_moments(values, values[:, -1:])
+        corr_row = corr_row[:, 0]
+        corr_row[-1] = 1.0
+        self._stats["cov"] = np.block([[stats["cov"], cov_row[:-1]], [cov_row.T]])
+        self._stats["corr"] = np.block([[stats["corr"], corr_row[:-1, None]], [corr_row[None]]])
+
+        if "mean" in stats:
+            self._stats["mean"] = np.append(stats["mean"], np.nanmean(values[:, -1]))
+        if "cholesky" in stats:
+            factor = sim.cholesky_append(stats["cholesky"], corr_row[:-1])
+            if factor is not None:
+                self._stats["cholesky"] = factor
+
+    def remove(self, code: str):
+        """Remove a series, dropping dates on which no other series has a return"""
+        index = self.codes.index(code)
+        values = np.delete(self.values, index, axis=1)
+        keep = ~np.isnan(values).all(axis=1)
+
+        stats = self._stats
+        self.codes = self.codes[:index] + self.codes[index + 1 :]
+        self.dates = self.dates[keep]
+        self.values = values[keep]
+        self._stats = {}
+
+        # The remaining statistics are unchanged under the pairwise policy
+        if self.missing != "pairwise":
+            return
+
+        for name in ("cov", "corr"):
+            if name in stats:
+                self._stats[name] = np.delete(np.delete(stats[name], index, axis=0), index, axis=1)
+        if "mean" in stats:
+            self._stats["mean"] = np.delete(stats["mean"], index)
+        if "cholesky" in stats:
+            self._stats["cholesky"] = sim.cholesky_delete(stats["cholesky"], index)
@@ -0,0 +1,109 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterator
+
+import numpy as np
+
+from . import tracing
+
+
+EXECUTORS = ("serial", "thread", "process")
+
+
+def get_num_blocks(executor="serial", workers=None) -> int:
+    """
+    Number of path blocks a simulation is split into.
+
+    Defaults to one block when serial and one per CPU otherwise. Results depend only on the seed and the
+    number of blocks, so a serial run with the same workers reproduces a parallel run exactly.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor: {executor}, expected one of {EXECUTORS}")
+
+    if workers is not None:
+        return max(1, int(workers))
+    return 1 if executor == "serial" else os.cpu_count() or 1
+
+
+def split_blocks(total: int, num_blocks: int, base2=False) -> list[int]:
+    """
+    Split a total number of sims into num_blocks near-equal, non-empty block sizes.
+
+    With base2, every block size is a power of 2 as Sobol sampling needs, so there may be more blocks than
+    num_blocks, but none larger than the near-equal size.
+    """
+    num_blocks = max(1, min(num_blocks, total))
+    if not base2:
+        base, extra = divmod(total, num_blocks)
+        return [base + (i < extra) for i in range(num_blocks)]
+
+    # Start from the binary digits of total, halving the largest block until there are enough small blocks
+    max_size = -(-total // num_blocks)
+    sizes = [1 << i for i in reversed(range(total.bit_length())) if total >> i & 1]
+    while sizes[0] > 1 and (len(sizes) < num_blocks or sizes[0] > max_size):
+        half = sizes.pop(0) // 2
+        sizes = sorted(sizes + [half, half], reverse=True)
+    return sizes
+
+
+def spawn_seeds(seed, num_blocks: int) -> list[np.random.SeedSequence]:
+    """
+    Independent child seeds for each block, derived from a single seed (or fresh entropy if None).
+
+    seed may also be a SeedSequence, e.g. one spawned for a replicate.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(num_blocks)
+
+
+def map_blocks(func: Callable, blocks: list[tuple], executor="serial", workers=None) -> list:
+    """
+    Call func(*args) for each tuple of args in blocks, returning the results in order.
+
+    executor is "serial", "thread" or "process". For processes, func and its arguments must be picklable.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor: {executor}, expected one of {EXECUTORS}")
+
+    if executor == "serial" or len(blocks) <= 1:
+        return [func(*args) for args in blocks]
+
+    if executor == "thread":
+        pool_type, func = ThreadPoolExecutor, tracing.propagate(func)
+    else:
+        pool_type = ProcessPoolExecutor
+    with pool_type(max_workers=workers) as pool:
+        futures = [pool.submit(func, *args) for args in blocks]
+        return [future.result() for future in futures]
+
+
+def imap_blocks(func: Callable, blocks: list[tuple], executor="serial", workers=None) -> Iterator:
+    """
+    Like map_blocks, but yield each result in order as soon as it is ready.
+
+    At most two blocks per worker are submitted ahead of the one being yielded, so a caller that reduces
+    each result as it arrives holds only a few blocks in memory at once.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor: {executor}, expected one of {EXECUTORS}")
+
+    if executor == "serial" or len(blocks) <= 1:
+        for args in blocks:
+            yield func(*args)
+        return
+
+    if executor == "thread":
+        pool_type, func = ThreadPoolExecutor, tracing.propagate(func)
+    else:
+        pool_type = ProcessPoolExecutor
+    window = 2 * (workers or os.cpu_count() or 1)
+    with pool_type(max_workers=workers) as pool:
+        pending = deque()
+        for args in blocks:
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,161 @@
+import datetime as dt
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import pandas as pd
+import yfinance as yf
+
+
+# Errors a provider may raise when a download fails or returns unusable data, network errors subclass OSError
+PROVIDER_ERRORS = (OSError, KeyError, IndexError, ValueError, yf.exceptions.YFException)
+
+
+class DataProvider(ABC):
+    """
+    Source of daily price history and company information.
+
+    Subclasses must implement get_history and may implement get_info. Histories are dataframes with a
+    timezone naive DatetimeIndex, sorted ascending, and at least a Close column. An unknown symbol gives an
+    empty dataframe.
+
+    cache_prices sets whether tickers keep an on-disk copy of the history, which is only worthwhile
+    for slow, remote sources.
+    """
+
+    cache_prices = False
+
+    @abstractmethod
+    def get_history(self, symbol: str, start: dt.datetime, end: dt.datetime) -> pd.DataFrame:
+        """Daily price history from start (inclusive) to end (exclusive)"""
+
+    def get_info(self, symbol: str) -> dict:
+        """Company information, empty when the provider has none"""
+        return {}
+
+
+def _normalize_history(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the index of a price history to a sorted, timezone naive DatetimeIndex"""
+    df = df.copy()
+    df.index = pd.DatetimeIndex(df.index)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    return df.sort_index()
+
+
+def _slice_history(df: pd.DataFrame, start: dt.datetime, end: dt.datetime) -> pd.DataFrame:
+    return df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+
+class YahooProvider(DataProvider):
+    """Live data from yahoo finance"""
+
+    cache_prices = True
+
+    def get_history(self, symbol: str, start: dt.datetime, end: dt.datetime) -> pd.DataFrame:
+        df = yf.Ticker(ticker=symbol).history(start=start, end=end, interval="1d")
+        if df.empty:
+            return df
+
+        # Convert timestamp to standard timezone naive datetime
+        df.index = df.index.tz_localize(None)
+
+        return df
+
+    def get_info(self, symbol: str) -> dict:
+        return yf.Ticker(ticker=symbol).info
+
+
+class LocalDirectoryProvider(DataProvider):
+    """
+    Data from a directory of price history files, such as a nightly snapshot.
+
+    Each symbol is read from <symbol>.parquet or <symbol>.csv, with the date as the first column (or index).
+    Company information is read from an optional info.json mapping each symbol to a dict.
+    Files are read once and kept in memory.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._histories = {}
+        self._info = None
+        self._lock = threading.Lock()
+
+    def _read_history(self, symbol: str) -> pd.DataFrame:
+        parquet_path = self.path / f"{symbol}.parquet"
+        csv_path = self.path / f"{symbol}.csv"
+
+        if parquet_path.exists():
+            df = pd.read_parquet(parquet_path)
+        elif csv_path.exists():
+            df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        else:
+            return pd.DataFrame(columns=["Close"], index=pd.DatetimeIndex([]))
+
+        return _normalize_history(df)
+
+    def get_history(self, symbol: str, start: dt.datetime, end: dt.datetime) -> pd.DataFrame:
+        with self._lock:
+            df = self._histories.get(symbol)
+        if df is None:
+            df = self._read_history(symbol)
+            with self._lock:
+                self._histories[symbol] = df
+
+        return _slice_history(df, start, end)
+
+    def get_info(self, symbol: str) -> dict:
+        with self._lock:
+            if self._info is None:
+                try:
+                    with open(self.path / "info.json") as f:
+                        self._info = json.load(f)
+                except FileNotFoundError:
+                    self._info = {}
+            return self._info.get(symbol, {})
+
+
+class InMemoryProvider(DataProvider):
+    """
+    Data held in memory, given as a dict of symbol to price history dataframe (or series of closing prices).
+
+    info optionally maps each symbol to a dict of company information.
+    """
+
+    def __init__(self, histories: dict, info=None):
+        self.histories = {}
+        for symbol, history in histories.items():
+            if isinstance(history, pd.Series):
+                history = history.to_frame("Close")
+            self.histories[symbol] = _normalize_history(history)
+        self.info = dict(info or {})
+
+    def get_history(self, symbol: str, start: dt.datetime, end: dt.datetime) -> pd.DataFrame:
+        df = self.histories.get(symbol)
+        if df is None:
+            return pd.DataFrame(columns=["Close"], index=pd.DatetimeIndex([]))
+        return _slice_history(df, start, end)
+
+    def get_info(self, symbol: str) -> dict:
+        return self.info.get(symbol, {})
+
+
+# Set FINANCE_DATA_DIR to read from a local snapshot instead of yahoo finance by default
+if "FINANCE_DATA_DIR" in os.environ:
+    _default_provider = LocalDirectoryProvider(os.environ["FINANCE_DATA_DIR"])
+else:
+    _default_provider = YahooProvider()
+
+
+def get_default_provider() -> DataProvider:
+    return _default_provider
+
+
+def set_default_provider(provider: DataProvider) -> DataProvider:
+    """Set the provider used when none is given, returning the previous one"""
+    global _default_provider
+    previous = _default_provider
+    _default_provider = provider
+    return previous
@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    Streaming, mergeable quantile estimator for many series of positive values at once.
+
+    Typically one series per forecast day: update() takes blocks of simulated paths of shape (sims, width)
+    and quantiles() returns per-day quantiles without ever holding all paths in memory.
+
+    Values are counted in logarithmically spaced buckets (as in DDSketch), so every returned quantile is
+    within a relative error of relative_accuracy of the nearest rank sample quantile, i.e. np.quantile with
+    method="lower". The default interpolated np.quantile can differ from that by more than relative_accuracy
+    when neighbouring samples are far apart.
+    Sketches with the same width and accuracy can be merged, e.g. from separate workers.
+    """
+
+    def __init__(self, width: int, relative_accuracy=0.001):
+        self.width = width
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+
+        # Each series only stores the buckets between its own smallest and largest value, series i covers
+        # buckets low[i] to low[i] + length[i] - 1 and the counts of every series are stored one after another
+        self.low = np.zeros(width, dtype=np.int64)
+        self.length = np.zeros(width, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int32)
+        self.count = 0
+
+    @staticmethod
+    def _positions(low, length, sub_low, sub_length) -> np.ndarray:
+        """Positions in counts laid out by (low, length) of each bucket in the sub ranges, in storage order"""
+        starts = np.cumsum(length) - length
+        sub_starts = np.cumsum(sub_length) - sub_length
+        row_offsets = starts + sub_low - low - sub_starts
+        return np.repeat(row_offsets, sub_length) + np.arange(sub_length.sum())
+
+    def _reserve(self, n: int):
+        """Widen the counts before adding n values if they could overflow 32 bits"""
+        if self.counts.dtype == np.int32 and self.count + n > np.iinfo(np.int32).max:
+            self.counts = self.counts.astype(np.int64)
+
+    def _resize(self, low: np.ndarray, high: np.ndarray):
+        """Grow the bucket range of each series i to cover bucket indices low[i] to high[i] inclusive"""
+        if self.count == 0:
+            self.low = low.astype(np.int64)
+            self.length = (high - low + 1).astype(np.int64)
+            self.counts = np.zeros(self.length.sum(), dtype=self.counts.dtype)
+            return
+
+        new_low = np.minimum(low, self.low)
+        new_length = np.maximum(high, self.low + self.length - 1) - new_low + 1
+        if np.array_equal(new_length, self.length):
+            return
+
+        counts = np.zeros(new_length.sum(), dtype=self.counts.dtype)
+        counts[self._positions(new_low, new_length, self.low, self.length)] = self.counts
+        self.counts = counts
+        self.low = new_low
+        self.length = new_length
+
+    def update(self, values: np.ndarray):
+        """Add a block of values of shape (n, width)"""
+        values = np.asarray(values)
+        if values.ndim != 2 or values.shape[1] != self.width:
+            raise ValueError(f"Expected values of shape (n, {self.width}), got {values.shape}")
+        if np.any(values <= 0):
+            raise ValueError("QuantileSketch only supports positive values")
+        if values.shape[0] == 0:
+            return
+
+        buckets = np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+        self._reserve(values.shape[0])
+        self._resize(buckets.min(axis=0), buckets.max(axis=0))
+
+        starts = np.cumsum(self.length) - self.length
+        flat = buckets - self.low + starts
+        self.counts += np.bincount(flat.ravel(), minlength=len(self.counts)).astype(
+            self.counts.dtype, copy=False
+        )
+        self.count += values.shape[0]
+
+    def merge(self, other: "QuantileSketch"):
+        """Add the counts of another sketch with the same width and accuracy"""
+        if other.width != self.width or other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can only merge sketches with the same width and accuracy")
+        if other.count == 0:
+            return
+
+        self._reserve(other.count)
+        self._resize(other.low, other.low + other.length - 1)
+        self.counts[self._positions(self.low, self.length, other.low, other.length)] += other.counts
+        self.count += other.count
+
+    def quantiles(self, q) -> np.ndarray:
+        """
+        Estimate quantiles (between 0 and 1) of every series.
+
+        Returns an array of shape (len(q), width)
+        """
+        if self.count == 0:
+            raise ValueError("Cannot estimate quantiles of an empty sketch")
+
+        q = np.atleast_1d(q)
+        ranks = np.floor(q * (self.count - 1)).astype(np.int64)
+
+        # The running total over all series is non-decreasing, so the bucket holding a rank of series i is
+        # found by searching for the total before series i plus the rank
+        cumulative = np.cumsum(self.counts, dtype=np.int64)
+        starts = np.cumsum(self.length) - self.length
+        before = np.concatenate([[0], cumulative])[starts]
+
+        result = np.empty((len(q), self.width))
+        for i, rank in enumerate(ranks):
+            position = np.searchsorted(cumulative, before + rank, side="right")
+            bucket = position - starts + self.low
+            result[i] = 2 * self.gamma**bucket / (self.gamma + 1)
+        return result
+
+    def percentiles(self, percentiles) -> np.ndarray:
+        """Estimate percentiles (between 0 and 100) of every series"""
+        return self.quantiles(np.asarray(percentiles) / 100)
@@ -1,15 +1,307 @@
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
-import scipy.stats as stats
+import scipy.linalg as linalg
+import scipy.special as special
+from scipy.stats import qmc
+
+
+SAMPLING_METHODS = ("random", "antithetic", "sobol", "lhs")
+
+
+def cholesky_factor(corr_matrix) -> np.ndarray:
+    """
+    Lower triangular Cholesky factor of a correlation matrix.
+
+    Near-singular or slightly indefinite matrices (e.g. pairwise correlations over mismatched histories)
+    are first projected to the nearest valid correlation matrix by clipping their eigenvalues.
+    """
+    corr_matrix = np.asarray(corr_matrix, dtype=np.float64)
+    try:
+        return np.linalg.cholesky(corr_matrix)
+    except np.linalg.LinAlgError:
+        pass
 
+    eigvals, eigvecs = np.linalg.eigh((corr_matrix + corr_matrix.T) / 2)
+    eigvals = np.clip(eigvals, 1e-8, None)
+    repaired = (eigvecs * eigvals) @ eigvecs.T
+
+    # Rescale back to a unit diagonal
+    d = np.sqrt(np.diag(repaired))
+    repaired = repaired / np.outer(d, d)
+    np.fill_diagonal(repaired, 1.0)
+
+    return np.linalg.cholesky(repaired)
+
+
+def cholesky_append(factor: np.ndarray, corr_row) -> np.ndarray | None:
+    """
+    Extend a Cholesky factor with a new element, given its correlations with the existing elements.
+
+    Returns None if the extended matrix isn't positive definite, in which case it should be refactorized.
+    """
+    corr_row = np.asarray(corr_row, dtype=np.float64)
+    n = factor.shape[0]
+    if n == 0:
+        return np.ones((1, 1))
+
+    row = linalg.solve_triangular(factor, corr_row, lower=True)
+    remainder = 1 - row @ row
+    if not np.isfinite(remainder) or remainder <= 1e-10:
+        return None
+
+    extended = np.zeros((n + 1, n + 1))
+    extended[:n, :n] = factor
+    extended[n, :n] = row
+    extended[n, n] = np.sqrt(remainder)
+    return extended
+
+
+def cholesky_delete(factor: np.ndarray, index: int) -> np.ndarray:
+    """
+    Cholesky factor of the matrix with one element's row and column removed.
+
+    The rows below the removed element absorb its column through a rank one update, which is O(n^2).
+    """
+    column = factor[index + 1 :, index].copy()
+    reduced = np.delete(np.delete(factor, index, axis=0), index, axis=1)
+
+    # Rank one update of the trailing block: L L^T + x x^T
+    trailing = reduced[index:, index:]
+    for k in range(len(column)):
+        r = np.hypot(trailing[k, k], column[k])
+        c = r / trailing[k, k]
+        s = column[k] / trailing[k, k]
+        trailing[k, k] = r
+        trailing[k + 1 :, k] = (trailing[k + 1 :, k] + s * column[k + 1 :]) / c
+        column[k + 1 :] = c * column[k + 1 :] - s * trailing[k + 1 :, k]
+
+    return reduced
+
+
+def simulate_standard_normal_samples(
+    shape: tuple[int, int, int], rng=None, sampling="random"
+) -> np.ndarray:
+    """
+    Independent standard normal samples of shape (days, sims, num_elements).
+
+    sampling selects the strategy:
+        "random": plain pseudo-random draws
+        "antithetic": pseudo-random draws for half the sims, mirrored for the other half
+        "sobol": scrambled Sobol points over all days and elements of each path, best with a power of 2 sims
+        "lhs": Latin hypercube points over all days and elements of each path
+    """
+    rng = np.random.default_rng(rng)
+    days, sims, num_elements = shape
 
-def simulate_correlated_uniform_samples(num_elements: int, corr_matrix, sims=1000):
-    means = np.zeros(num_elements)
-    mvn_samples = np.random.multivariate_normal(means, cov=corr_matrix, size=sims)
-    uniform_samples = stats.norm.cdf(mvn_samples)
+    if sampling == "random":
+        return rng.standard_normal(size=shape)
+
+    if sampling == "antithetic":
+        half = rng.standard_normal(size=(days, (sims + 1) // 2, num_elements))
+        return np.concatenate([half, -half], axis=1)[:, :sims]
+
+    # Quasi-random points treat each path as one point in days * num_elements dimensions
+    dimensions = days * num_elements
+    if sampling == "sobol":
+        if dimensions > qmc.Sobol.MAXDIM:
+            raise ValueError(
+                f"Sobol sampling supports at most {qmc.Sobol.MAXDIM} days x elements, got {dimensions}"
+            )
+        # Sobol points are only balanced in powers of 2, so draw the next one up and keep the first sims
+        sampler = qmc.Sobol(d=dimensions, scramble=True, seed=rng)
+        points = sampler.random_base2(max(sims - 1, 0).bit_length())[:sims]
+    elif sampling == "lhs":
+        points = qmc.LatinHypercube(d=dimensions, seed=rng).random(sims)
+    else:
+        raise ValueError(f"Unknown sampling method: {sampling}, expected one of {SAMPLING_METHODS}")
+
+    points = np.clip(points, 1e-16, 1 - 1e-16)
+    samples = special.ndtri(points).reshape(sims, days, num_elements)
+    return samples.transpose(1, 0, 2)
+
+
+def simulate_correlated_normal_samples(
+    factor: np.ndarray, days: int, sims=1000, rng=None, sampling="random"
+):
+    """
+    Draw standard normal samples correlated by a Cholesky factor for every day in one call.
+
+    rng is a numpy Generator or seed, sampling is one of SAMPLING_METHODS (see simulate_standard_normal_samples).
+
+    Returns a 3D array of shape (days, num_elements, sims)
+    """
+    num_elements = factor.shape[0]
+    samples = simulate_standard_normal_samples(
+        (days, sims, num_elements), rng=rng, sampling=sampling
+    )
+    correlated = samples @ factor.T
+    return correlated.transpose(0, 2, 1)
+
+
+def simulate_correlated_uniform_samples(
+    num_elements: int, corr_matrix, sims=1000, factor=None, rng=None, sampling="random"
+):
+    """
+    Gaussian copula samples of shape (sims, num_elements).
+
+    Pass a precomputed Cholesky factor of corr_matrix to skip the factorization.
+    """
+    if factor is None:
+        factor = cholesky_factor(corr_matrix)
+
+    mvn_samples = simulate_correlated_normal_samples(
+        factor, days=1, sims=sims, rng=rng, sampling=sampling
+    )[0].T
+    uniform_samples = special.ndtr(mvn_samples)
     return uniform_samples
 
 
+def student_t_ppf(uniform_samples, df, loc, scale):
+    """Percent point function of the students T distribution, broadcast over parameter arrays."""
+    return special.stdtrit(df, uniform_samples) * scale + loc
+
+
+# Grid used to tabulate the mapping from normal samples to students T quantiles.
+# Normal samples beyond the limit (probability ~1e-17) are clipped to it.
+_T_GRID_LIMIT = 8.5
+_T_GRID_POINTS = 16385
+_T_GRID = np.linspace(-_T_GRID_LIMIT, _T_GRID_LIMIT, _T_GRID_POINTS)
+
+
+@lru_cache(maxsize=1024)
+def _student_t_table(df: float) -> tuple[np.ndarray, np.ndarray]:
+    """Standard students T quantiles of the normal grid points, and the slopes between them"""
+    # The mapping is odd, evaluate the lower tail only to avoid cdf values rounding to 1
+    values = -np.sign(_T_GRID) * special.stdtrit(df, special.ndtr(-np.abs(_T_GRID)))
+    slopes = np.diff(values)
+    values.flags.writeable = False
+    slopes.flags.writeable = False
+    return values, slopes
+
+
+def normal_to_student_t(normal_samples: np.ndarray, df, loc, scale) -> np.ndarray:
+    """
+    Map standard normal samples onto students T marginals, equivalent to t.ppf(norm.cdf(z)).
+
+    normal_samples has shape (..., num_elements, sims) and df, loc and scale hold one value per element.
+    The mapping is tabulated once per degrees of freedom (and reused across calls) and linearly interpolated,
+    which is orders of magnitude faster than evaluating the T quantile function for every sample, with
+    negligible interpolation error.
+    """
+    df, loc, scale = np.atleast_1d(df), np.atleast_1d(loc), np.atleast_1d(scale)
+    step = _T_GRID[1] - _T_GRID[0]
+
+    # Positions of each sample on the grid, shared by all elements
+    positions = (np.clip(normal_samples, -_T_GRID_LIMIT, _T_GRID_LIMIT) + _T_GRID_LIMIT) / step
+    indices = np.minimum(positions.astype(np.intp), _T_GRID_POINTS - 2)
+    weights = positions - indices
+
+    out = np.empty(normal_samples.shape, dtype=np.float64)
+    for j in range(normal_samples.shape[-2]):
+        values, slopes = _student_t_table(float(df[j]))
+
+        idx = indices[..., j, :]
+        standard = values[idx] + weights[..., j, :] * slopes[idx]
+        out[..., j, :] = standard * scale[j] + loc[j]
+
+    return out
+
+
+def simulate_correlated_t_returns(
+    factor: np.ndarray, df, loc, scale, days: int, sims=1000, rng=None, sampling="random"
+) -> np.ndarray:
+    """
+    Simulate returns with students T marginals joined by a Gaussian copula.
+
+    factor is the Cholesky factor of the copula correlation matrix and df, loc and scale hold the
+    marginal parameters for each element. rng is a numpy Generator or seed and sampling is one of
+    SAMPLING_METHODS.
+
+    Returns a 3D array of shape (days, num_elements, sims)
+    """
+    normal_samples = simulate_correlated_normal_samples(
+        factor, days=days, sims=sims, rng=rng, sampling=sampling
+    )
+    return normal_to_student_t(normal_samples, df, loc, scale)
+
+
+def simulate_t_samples(rng: np.random.Generator, df, loc, scale, size, dtype=np.float64):
+    """
+    Draw students T samples from a numpy Generator, optionally in float32.
+
+    Built from a normal and a gamma draw (T = Z / sqrt(V / df) with V chi-squared), as both support float32.
+    """
+    normal = rng.standard_normal(size=size, dtype=dtype)
+    gamma = rng.standard_gamma(np.asarray(df, dtype=dtype) / 2, size=size, dtype=dtype)
+    samples = normal * np.sqrt(np.asarray(df / 2, dtype=dtype) / gamma)
+    return samples * np.asarray(scale, dtype=dtype) + np.asarray(loc, dtype=dtype)
+
+
+def get_student_t_params(dists) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Collect (df, loc, scale) arrays from a list of fitted students T distributions."""
+    df = np.array([dist.df for dist in dists])
+    loc = np.array([dist.loc for dist in dists])
+    scale = np.array([dist.scale for dist in dists])
+    return df, loc, scale
+
+
+def _lag_correlations(data: np.ndarray, max_lag: int) -> np.ndarray:
+    """
+    Correlation of every column of a 2D array with itself shifted by each lag from 0 to max_lag.
+
+    Matches pandas series.corr(series.shift(lag)), i.e. the Pearson correlation of the overlapping values.
+    Overlapping sums come from cumulative sums and the lagged cross products from an FFT, so all lags are
+    computed in O(n log n).
+
+    Returns an array of shape (max_lag + 1, num_columns)
+    """
+    n = data.shape[0]
+    lags = np.arange(max_lag + 1)
+
+    # Centering doesn't change the correlations but reduces cancellation in the sums below
+    x = data - data.mean(axis=0)
+
+    # Long enough to avoid circular wrap around, and to give a value for every lag when max_lag >= n
+    nfft = 1 << int(np.ceil(np.log2(max(2 * n - 1, max_lag + 1, 1))))
+    spectrum = np.fft.rfft(x, n=nfft, axis=0)
+    cross = np.fft.irfft(spectrum * np.conj(spectrum), n=nfft, axis=0)[: max_lag + 1]
+
+    zeros = np.zeros((1, x.shape[1]))
+    sums = np.concatenate([zeros, np.cumsum(x, axis=0)])
+    squares = np.concatenate([zeros, np.cumsum(x**2, axis=0)])
+
+    valid_lags = np.minimum(lags, n)
+    overlap = (n - valid_lags)[:, None].astype(np.float64)
+
+    # Sums over the leading values x[lag:] and the lagged values x[:n - lag]
+    sum_lead = sums[n] - sums[valid_lags]
+    sum_lag = sums[n - valid_lags]
+    square_lead = squares[n] - squares[valid_lags]
+    square_lag = squares[n - valid_lags]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = cross - sum_lead * sum_lag / overlap
+        variance_lead = square_lead - sum_lead**2 / overlap
+        variance_lag = square_lag - sum_lag**2 / overlap
+        correlations = covariance / np.sqrt(variance_lead * variance_lag)
+
+    # Pandas returns NaN without at least two overlapping values
+    correlations[overlap[:, 0] < 2] = np.nan
+    return correlations
+
+
+def _lag_correlations_df(directional: np.ndarray, non_directional: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Lag": list(range(len(directional))),
+            "Directional": directional,
+            "Non-Directional": non_directional,
+        }
+    )
+
+
 def calculate_lag_correlations(series, max_lag):
     """
     Calculate both directional and non-directional correlations for a range of lags in a time series.
@@ -17,43 +309,41 @@ def calculate_lag_correlations(series, max_lag):
     Returns:
     pandas.DataFrame: Dataframe containing both types of correlations for each lag.
     """
-    directional_correlations = {}
-    non_directional_correlations = {}
+    values = np.asarray(series, dtype=np.float64)[:, None]
+    directional = _lag_correlations(values, max_lag)[:, 0]
+    non_directional = _lag_correlations(np.abs(values), max_lag)[:, 0]
+    return _lag_correlations_df(directional, non_directional)
+
+
+def calculate_panel_lag_correlations(panel: pd.DataFrame, max_lag) -> dict[str, pd.DataFrame]:
+    """
+    Calculate lag correlations for every column of a panel of time series, e.g. a portfolio's log returns.
 
-    # Directional correlation
-    for lag in range(max_lag + 1):
-        lagged_series = series.shift(lag)
-        correlation = series.corr(lagged_series)
-        directional_correlations[lag] = correlation
+    Columns without missing values are processed together, columns with missing values have them dropped first.
 
-    # Non-directional correlation
-    abs_series = series.abs()
-    for lag in range(max_lag + 1):
-        lagged_series = abs_series.shift(lag)
-        correlation = abs_series.corr(lagged_series)
-        non_directional_correlations[lag] = correlation
+    Returns a dict of column name to a dataframe in the layout of calculate_lag_correlations.
+    """
+    complete = panel.columns[panel.notna().all()]
+    results = {}
 
-    # Combining into a DataFrame
-    correlations_df = pd.DataFrame(
-        {
-            "Lag": list(range(max_lag + 1)),
-            "Directional": list(directional_correlations.values()),
-            "Non-Directional": list(non_directional_correlations.values()),
-        }
-    )
+    if len(complete):
+        values = panel[complete].to_numpy(dtype=np.float64)
+        directional = _lag_correlations(values, max_lag)
+        non_directional = _lag_correlations(np.abs(values), max_lag)
+        for i, column in enumerate(complete):
+            results[column] = _lag_correlations_df(directional[:, i], non_directional[:, i])
+
+    for column in panel.columns.difference(complete, sort=False):
+        results[column] = calculate_lag_correlations(panel[column].dropna(), max_lag)
 
-    return correlations_df
+    return {column: results[column] for column in panel.columns}
 
 
 def convert_correlation_matrix(corr_matrix, volatilities) -> np.ndarray:
     """Upscale a correlation matrix to covariance using a set of volatilities."""
 
-    n = len(volatilities)
-    covariance_matrix = np.zeros((n, n))
-    for i in range(n):
-        for j in range(n):
-            covariance_matrix[i, j] = corr_matrix[i, j] * volatilities[i] * volatilities[j]
-    return covariance_matrix
+    volatilities = np.asarray(volatilities)
+    return np.asarray(corr_matrix) * np.outer(volatilities, volatilities)
 
 
 def calculate_portfolio_performance(returns, weights, cov_matrix) -> tuple[float, float]:
@@ -62,5 +352,44 @@ def calculate_portfolio_performance(returns, weights, cov_matrix) -> tuple[float
     return portfolio_return, portfolio_volatility
 
 
-def generate_random_weights(num_securities, sims=1000):
-    return np.random.dirichlet(alpha=np.ones(num_securities), size=sims)
+def calculate_portfolio_performance_batch(
+    returns, weights, cov_matrix, dtype=np.float64
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Expected returns and volatilities for a whole matrix of portfolio weights of shape (sims, num_securities).
+
+    Set dtype to np.float32 to halve memory and speed up very large batches.
+    """
+    weights = np.asarray(weights, dtype=dtype)
+    returns = np.asarray(returns, dtype=dtype)
+    cov_matrix = np.asarray(cov_matrix, dtype=dtype)
+
+    portfolio_returns = weights @ returns
+    portfolio_variances = np.einsum("ij,ij->i", weights @ cov_matrix, weights)
+    portfolio_volatilities = np.sqrt(np.maximum(portfolio_variances, 0))
+    return portfolio_returns, portfolio_volatilities
+
+
+def calculate_portfolio_balance(log_returns: np.ndarray, starting_balances) -> np.ndarray:
+    """
+    Convert simulated log returns of shape (days, num_securities, sims) into total portfolio balances.
+
+    The returns array is overwritten in place to avoid allocating another cube of the same size.
+    Returns an array of shape (sims, days + 1), starting with the total starting balance.
+    """
+    days, _, sims = log_returns.shape
+    starting_balances = np.asarray(starting_balances, dtype=np.float64)
+
+    np.cumsum(log_returns, axis=0, out=log_returns)
+    np.exp(log_returns, out=log_returns)
+
+    portfolio_balance = np.empty((sims, days + 1))
+    portfolio_balance[:, 0] = starting_balances.sum()
+    portfolio_balance[:, 1:] = np.einsum("dts,t->sd", log_returns, starting_balances)
+
+    return portfolio_balance
+
+
+def generate_random_weights(num_securities, sims=1000, rng=None):
+    rng = np.random.default_rng(rng)
+    return rng.dirichlet(alpha=np.ones(num_securities), size=sims)
@@ -0,0 +1,228 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Spans beyond this many are still summarised but not kept individually for the trace export
+MAX_SPANS = 100_000
+
+
+class Collector:
+    """
+    Records timing spans and counters while tracing is enabled.
+
+    Spans opened inside another span are nested under it, including spans opened in worker threads started
+    with propagate, and are summarised by their path, e.g. "load_tickers/Ticker.build_ticker_df".
+    Only the first max_spans spans are kept for to_trace, the summary covers every span.
+    """
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self.start_ns = time.perf_counter_ns()
+        self.max_spans = max_spans
+        self.spans = []
+        self.dropped_spans = 0
+        self.counters = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, path: str, start_ns: int, duration_ns: int, depth: int):
+        with self._lock:
+            stage = self._stages.get(path)
+            if stage is None:
+                stage = self._stages[path] = {
+                    "path": path,
+                    "depth": depth,
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "first": start_ns,
+                }
+            stage["count"] += 1
+            stage["total"] += duration_ns / 1e9
+            stage["max"] = max(stage["max"], duration_ns / 1e9)
+            stage["first"] = min(stage["first"], start_ns)
+
+            if len(self.spans) < self.max_spans:
+                self.spans.append((path, start_ns, duration_ns, depth, threading.get_ident()))
+            else:
+                self.dropped_spans += 1
+
+    def add_count(self, name: str, n: int):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> list[dict]:
+        """
+        Per-stage totals, with each stage followed by its nested stages, in the order they were first entered.
+
+        Each entry has the span path, depth, call count and total, mean and max time in seconds.
+        """
+        with self._lock:
+            stages = {path: dict(stage) for path, stage in self._stages.items()}
+
+        def tree_order(path):
+            parts = path.split("/")
+            prefixes = ("/".join(parts[: i + 1]) for i in range(len(parts)))
+            return tuple(stages[prefix]["first"] if prefix in stages else 0 for prefix in prefixes)
+
+        summary = []
+        for path in sorted(stages, key=tree_order):
+            stage = stages[path]
+            del stage["first"]
+            stage["mean"] = stage["total"] / stage["count"]
+            summary.append(stage)
+        return summary
+
+    def to_trace(self) -> dict:
+        """Spans and counters in the Chrome trace event format, viewable in chrome://tracing or Perfetto"""
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            dropped_spans = self.dropped_spans
+
+        events = [
+            {
+                "name": path.rsplit("/", 1)[-1],
+                "cat": path,
+                "ph": "X",
+                "ts": (start_ns - self.start_ns) / 1000,
+                "dur": duration_ns / 1000,
+                "pid": os.getpid(),
+                "tid": tid,
+            }
+            for path, start_ns, duration_ns, _, tid in spans
+        ]
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "counters": counters,
+            "droppedSpans": dropped_spans,
+        }
+
+    def export(self, path):
+        """Write the trace to a JSON file"""
+        with open(path, "w") as f:
+            json.dump(self.to_trace(), f)
+
+
+# Tracing is disabled while there is no collector, spans then cost a single context variable lookup.
+# Both are context variables so that each thread (e.g. each app session) traces independently.
+_collector = contextvars.ContextVar("tracing_collector", default=None)
+_path = contextvars.ContextVar("tracing_path", default=None)
+
+
+class _Span:
+    __slots__ = ("collector", "name", "path", "start_ns", "token")
+
+    def __init__(self, collector: Collector, name: str):
+        self.collector = collector
+        self.name = name
+
+    def __enter__(self):
+        parent = _path.get()
+        self.path = f"{parent}/{self.name}" if parent else self.name
+        self.token = _path.set(self.path)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration_ns = time.perf_counter_ns() - self.start_ns
+        _path.reset(self.token)
+        self.collector.add_span(self.path, self.start_ns, duration_ns, self.path.count("/"))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str):
+    """Context manager timing a block as a stage named name"""
+    collector = _collector.get()
+    if collector is None:
+        return _NULL_SPAN
+    return _Span(collector, name)
+
+
+def traced(name=None):
+    """Decorator timing every call of a function as a stage, named after the function by default"""
+
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            collector = _collector.get()
+            if collector is None:
+                return func(*args, **kwargs)
+            with _Span(collector, label):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(func):
+    """
+    Wrap func to run in the caller's tracing context, for submitting to a thread pool.
+
+    Spans in the worker thread are then recorded by the caller's collector, nested under the current span.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call runs in its own copy
+        return context.copy().run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def count(name: str, n=1):
+    """Increment a counter, such as cache hits"""
+    collector = _collector.get()
+    if collector is not None:
+        collector.add_count(name, n)
+
+
+def is_enabled() -> bool:
+    return _collector.get() is not None
+
+
+def start() -> Collector:
+    """Enable tracing in the current context, recording into a new collector"""
+    collector = Collector()
+    _collector.set(collector)
+    return collector
+
+
+def stop() -> Collector:
+    """Disable tracing in the current context, returning the collector that was recording"""
+    collector = _collector.get()
+    _collector.set(None)
+    return collector
+
+
+@contextmanager
+def collect():
+    """Trace everything run inside the block, yielding the collector"""
+    collector = Collector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
@@ -0,0 +1,17 @@
+import pytest
+
+from benchmarks.synthetic import build_synthetic_provider
+from lib.utils import cache, providers
+
+
+CODES = ["SYN000", "SYN001", "SYN002", "SYN003"]
+
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    """Synthetic in-memory data as the default provider, with the cache in a temporary directory"""
+    monkeypatch.setattr(cache, "CACHE_DIR", tmp_path)
+    provider = build_synthetic_provider(CODES, years=3)
+    previous = providers.set_default_provider(provider)
+    yield provider
+    providers.set_default_provider(previous)
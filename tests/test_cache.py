@@ -0,0 +1,189 @@
+import datetime as dt
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.utils import cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def read_fits_file(cache_dir) -> dict:
+    with open(cache_dir / "fits.json") as f:
+        return json.load(f)
+
+
+def test_fit_cache_key_changes_with_returns():
+    returns = np.array([0.01, -0.02, 0.005])
+
+    key = cache.fit_cache_key("AAA", 5, returns)
+
+    assert key == cache.fit_cache_key("AAA", 5, returns.copy())
+    assert key != cache.fit_cache_key("AAA", 5, np.append(returns, 0.001))
+    assert key != cache.fit_cache_key("AAA", 10, returns)
+    assert key != cache.fit_cache_key("BBB", 5, returns)
+
+
+def test_write_and_read_fit_params(cache_dir):
+    assert cache.read_fit_params("key", "daily") is None
+
+    assert cache.write_fit_params("key", "daily", (4.0, 0.001, 0.01))
+
+    assert cache.read_fit_params("key", "daily") == (4.0, 0.001, 0.01)
+    assert read_fits_file(cache_dir)["key"]["params"] == {"daily": [4.0, 0.001, 0.01]}
+
+
+@pytest.mark.parametrize("params", [(np.nan, 0.0, 0.01), (4.0, np.inf, 0.01)])
+def test_non_finite_fit_params_are_not_stored(cache_dir, params):
+    assert not cache.write_fit_params("key", "daily", params)
+
+    assert cache.read_fit_params("key", "daily") is None
+    assert not (cache_dir / "fits.json").exists()
+
+
+def test_unflushed_writes_are_read_from_memory(cache_dir):
+    cache.write_fit_params("key", "daily", (4.0, 0.0, 0.01), flush=False)
+
+    assert cache.read_fit_params("key", "daily") == (4.0, 0.0, 0.01)
+    assert not (cache_dir / "fits.json").exists()
+
+    cache.flush_fit_cache()
+    assert "key" in read_fits_file(cache_dir)
+
+
+def test_flush_merges_with_file(cache_dir):
+    cache.write_fit_params("a", "daily", (4.0, 0.0, 0.01))
+
+    # Another process writes to the file after it was loaded
+    entries = read_fits_file(cache_dir)
+    now = dt.datetime.now().isoformat()
+    entries["b"] = {"created": now, "params": {"daily": [5.0, 0.0, 0.02]}}
+    entries["c"] = {"created": now, "params": {"daily": [6.0, 0.0, 0.03]}}
+    with open(cache_dir / "fits.json", "w") as f:
+        json.dump(entries, f)
+
+    cache.write_fit_params("c", "annual", (7.0, 0.1, 0.2), flush=False)
+    cache.write_fit_params("d", "daily", (8.0, 0.0, 0.04), flush=False)
+    cache.flush_fit_cache()
+
+    entries = read_fits_file(cache_dir)
+    assert set(entries) == {"a", "b", "c", "d"}
+    assert entries["c"]["params"] == {"daily": [6.0, 0.0, 0.03], "annual": [7.0, 0.1, 0.2]}
+
+
+def test_flush_evicts_old_and_excess_entries(cache_dir, monkeypatch):
+    monkeypatch.setattr(cache, "FIT_CACHE_MAX_ENTRIES", 3)
+    now = dt.datetime.now()
+    ages = {f"k{i}": dt.timedelta(days=i) for i in range(1, 6)}
+    ages["old"] = cache.FIT_CACHE_MAX_AGE + dt.timedelta(days=1)
+    entries = {
+        key: {"created": (now - age).isoformat(), "params": {"daily": [4.0, 0.0, 0.01]}}
+        for key, age in ages.items()
+    }
+    with open(cache_dir / "fits.json", "w") as f:
+        json.dump(entries, f)
+
+    assert cache.read_fit_params("old", "daily") is None
+
+    cache.write_fit_params("new", "daily", (4.0, 0.0, 0.01))
+
+    assert set(read_fits_file(cache_dir)) == {"new", "k1", "k2"}
+    assert cache.read_fit_params("k5", "daily") is None
+
+
+def make_history(start="2024-01-01", periods=30, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Cached histories are read back with a nanosecond index and no frequency
+    index = pd.DatetimeIndex(pd.bdate_range(start, periods=periods).values.astype("datetime64[ns]"))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    return pd.DataFrame({"Close": close, "Volume": 1e6}, index=index)
+
+
+class FakeSource:
+    """Serves bars of a history up to the current last bar, recording every fetch"""
+
+    def __init__(self, history: pd.DataFrame, available: int):
+        self.history = history
+        self.available = available
+        self.calls = []
+
+    def fetch(self, start, end):
+        self.calls.append((pd.Timestamp(start), pd.Timestamp(end)))
+        df = self.history.iloc[: self.available]
+        return df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+
+def load(source, start, end=dt.datetime(2030, 1, 1)):
+    return cache.load_price_history("AAA", start=start, end=end, fetch=source.fetch)
+
+
+def test_price_history_is_served_from_cache():
+    source = FakeSource(make_history(), available=30)
+
+    first = load(source, dt.datetime(2024, 1, 1))
+    second = load(source, dt.datetime(2024, 1, 10))
+
+    assert len(source.calls) == 1
+    pd.testing.assert_frame_equal(first, source.history)
+    pd.testing.assert_frame_equal(second, first[first.index >= "2024-01-10"])
+
+
+def test_price_history_refresh_replaces_last_bar(monkeypatch):
+    history = make_history()
+    source = FakeSource(history.copy(), available=20)
+    load(source, dt.datetime(2024, 1, 1))
+
+    # The last cached bar was an incomplete day and has since closed differently
+    last_bar = history.index[19]
+    source.history.loc[last_bar, "Close"] += 1
+    source.available = 30
+    monkeypatch.setattr(cache, "PRICE_REFRESH_AGE", dt.timedelta(seconds=-1))
+
+    df = load(source, dt.datetime(2024, 1, 1))
+
+    assert source.calls[-1][0] == last_bar
+    assert df.index.is_unique
+    pd.testing.assert_frame_equal(df, source.history)
+
+
+def test_price_history_wider_request_refetches():
+    source = FakeSource(make_history(), available=30)
+    load(source, dt.datetime(2024, 1, 15))
+
+    df = load(source, dt.datetime(2024, 1, 1))
+
+    assert source.calls[-1][0] == pd.Timestamp(2024, 1, 1)
+    pd.testing.assert_frame_equal(df, source.history)
+    assert cache.read_price_history("AAA")[1] == pd.Timestamp(2024, 1, 1)
+
+
+def test_price_history_empty_refresh_keeps_cache(monkeypatch):
+    source = FakeSource(make_history(), available=30)
+    cached = load(source, dt.datetime(2024, 1, 1))
+    monkeypatch.setattr(cache, "PRICE_REFRESH_AGE", dt.timedelta(seconds=-1))
+    source.fetch = lambda start, end: pd.DataFrame(columns=["Close", "Volume"], index=pd.DatetimeIndex([]))
+
+    df = load(source, dt.datetime(2024, 1, 1))
+
+    pd.testing.assert_frame_equal(df, cached)
+    pd.testing.assert_frame_equal(cache.read_price_history("AAA")[0], cached)
+
+
+def test_price_history_failed_refresh_serves_cache(monkeypatch):
+    source = FakeSource(make_history(), available=30)
+    cached = load(source, dt.datetime(2024, 1, 1))
+    monkeypatch.setattr(cache, "PRICE_REFRESH_AGE", dt.timedelta(seconds=-1))
+
+    def fail(start, end):
+        raise ConnectionError("Temporary failure")
+
+    source.fetch = fail
+    df = load(source, dt.datetime(2024, 1, 5))
+
+    pd.testing.assert_frame_equal(df, cached[cached.index >= "2024-01-05"])
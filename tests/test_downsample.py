@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from app.downsample import downsample, lttb_indices
+
+
+def test_short_series_unchanged():
+    y = np.arange(10.0)
+
+    np.testing.assert_array_equal(lttb_indices(np.arange(10), y, max_points=10), np.arange(10))
+    np.testing.assert_array_equal(lttb_indices(np.arange(10), y, max_points=2), np.arange(10))
+
+
+def test_keeps_endpoints_and_count():
+    rng = np.random.default_rng(0)
+    y = np.cumsum(rng.standard_normal(10_000))
+
+    indices = lttb_indices(np.arange(len(y)), y, max_points=500)
+
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_preserves_spikes():
+    y = np.zeros(5_000)
+    y[1234] = 10.0
+    y[3456] = -10.0
+
+    indices = lttb_indices(np.arange(len(y)), y, max_points=100)
+
+    assert 1234 in indices and 3456 in indices
+
+
+def test_downsample_datetimes():
+    x = pd.date_range("2020-01-01", periods=3_000).values
+    y = np.sin(np.arange(3_000) / 50)
+
+    dx, dy = downsample(x, y, max_points=300)
+
+    assert len(dx) == len(dy) == 300
+    assert dx.dtype == x.dtype
+    assert dx[0] == x[0] and dx[-1] == x[-1]
+    np.testing.assert_array_equal(dy, y[np.searchsorted(x, dx)])
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import scipy.stats as stats
+
+from lib.utils import fitting as fit
+
+
+def log_likelihood(data, dist):
+    return stats.t.logpdf(data, dist.df, loc=dist.loc, scale=dist.scale).sum()
+
+
+@pytest.mark.parametrize("df", [3.0, 5.0, 30.0])
+def test_fit_student_t_matches_scipy(df):
+    data = stats.t.rvs(df, loc=0.0005, scale=0.01, size=2000, random_state=1)
+
+    dist = fit.fit_student_t(data)
+    reference = stats.t.fit(data)
+
+    assert log_likelihood(data, dist) >= log_likelihood(data, fit.StudentT(*reference)) - 1e-6
+    assert dist.loc == pytest.approx(reference[1], abs=1e-5)
+    assert dist.scale == pytest.approx(reference[2], rel=1e-3)
+
+
+def test_fit_student_t_batch_matches_single_fits_with_missing_data():
+    rng = np.random.default_rng(2)
+    data = stats.t.rvs(4, scale=0.02, size=(1000, 3), random_state=rng)
+    data[:200, 1] = np.nan
+    data[rng.random(1000) < 0.1, 2] = np.nan
+
+    dists = fit.fit_student_t_batch(data)
+
+    for i, dist in enumerate(dists):
+        column = data[:, i][~np.isnan(data[:, i])]
+        reference = fit.StudentT(*stats.t.fit(column))
+        assert log_likelihood(column, dist) >= log_likelihood(column, reference) - 1e-6
+
+
+def test_fit_student_t_batch_zero_mad():
+    # Mostly unchanged prices give a median absolute deviation of zero
+    rng = np.random.default_rng(3)
+    data = np.zeros((500, 2))
+    data[::10, 0] = rng.normal(0, 0.02, 50)
+    data[:, 1] = rng.standard_t(4, 500) * 0.01
+
+    dists = fit.fit_student_t_batch(data)
+
+    for dist in dists:
+        assert np.all(np.isfinite(dist)) and dist.scale > 0
+    reference = fit.StudentT(*stats.t.fit(data[:, 1]))
+    assert log_likelihood(data[:, 1], dists[1]) >= log_likelihood(data[:, 1], reference) - 1e-6
+
+
+def test_fit_student_t_constant_series():
+    dist = fit.fit_student_t(np.full(100, 0.001))
+
+    assert np.all(np.isfinite(dist)) and dist.scale > 0
+    assert dist.loc == pytest.approx(0.001)
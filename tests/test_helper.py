@@ -0,0 +1,93 @@
+import datetime as dt
+import json
+import threading
+
+import pytest
+
+from lib.utils import cache, helper
+
+
+@pytest.fixture(autouse=True)
+def risk_free_rate(tmp_path, monkeypatch):
+    """Start from an empty in-process and on-disk risk free rate"""
+    monkeypatch.setattr(cache, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(
+        helper,
+        "_risk_free_rate",
+        {"rate": None, "fetched_at": None, "failed_at": None, "refreshing": False},
+    )
+
+
+def test_risk_free_rate_is_downloaded_once_and_persisted(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(helper, "calculate_risk_free_rate", lambda: calls.append(1) or 0.05)
+
+    assert helper.get_risk_free_rate() == 0.05
+    assert helper.get_risk_free_rate() == 0.05
+
+    assert len(calls) == 1
+    with open(tmp_path / "risk_free_rate.json") as f:
+        assert json.load(f)["rate"] == 0.05
+
+
+def test_failed_download_backs_off(monkeypatch):
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ConnectionError("Temporary failure")
+
+    monkeypatch.setattr(helper, "calculate_risk_free_rate", fail)
+    assert helper.get_risk_free_rate() == helper.DEFAULT_RISK_FREE_RATE
+    assert helper.get_risk_free_rate() == helper.DEFAULT_RISK_FREE_RATE
+    assert len(calls) == 1
+
+    helper._risk_free_rate["failed_at"] -= helper.RISK_FREE_RATE_RETRY_DELAY
+    monkeypatch.setattr(helper, "calculate_risk_free_rate", lambda: 0.05)
+    assert helper.get_risk_free_rate() == 0.05
+
+
+def test_failed_refresh_serves_stale_rate(monkeypatch):
+    monkeypatch.setattr(helper, "calculate_risk_free_rate", lambda: 0.05)
+    helper.get_risk_free_rate()
+    helper._risk_free_rate["fetched_at"] -= helper.RISK_FREE_RATE_MAX_AGE * 2
+
+    def fail():
+        raise ConnectionError("Temporary failure")
+
+    monkeypatch.setattr(helper, "calculate_risk_free_rate", fail)
+    assert helper.get_risk_free_rate() == 0.05
+
+
+def test_programming_errors_propagate(monkeypatch):
+    def broken():
+        raise TypeError("bug")
+
+    monkeypatch.setattr(helper, "calculate_risk_free_rate", broken)
+    with pytest.raises(TypeError):
+        helper.get_risk_free_rate()
+
+
+def test_refresh_does_not_block_other_callers(monkeypatch):
+    monkeypatch.setattr(helper, "calculate_risk_free_rate", lambda: 0.05)
+    helper.get_risk_free_rate()
+    helper._risk_free_rate["fetched_at"] -= helper.RISK_FREE_RATE_MAX_AGE * 2
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_download():
+        started.set()
+        release.wait(timeout=10)
+        return 0.06
+
+    monkeypatch.setattr(helper, "calculate_risk_free_rate", slow_download)
+    refresh = threading.Thread(target=helper.get_risk_free_rate)
+    refresh.start()
+    assert started.wait(timeout=10)
+
+    # Served the stale rate while the download is in progress
+    assert helper.get_risk_free_rate() == 0.05
+
+    release.set()
+    refresh.join()
+    assert helper.get_risk_free_rate() == 0.06
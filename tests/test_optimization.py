@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import scipy.optimize as optimize
+
+from lib.utils import optimization as opt
+
+
+def random_problem(n=5, seed=0):
+    rng = np.random.default_rng(seed)
+    cov = np.cov(rng.standard_normal((200, n)), rowvar=False) * 0.04
+    returns = rng.normal(0.08, 0.05, n)
+    return returns, cov
+
+
+def test_minimum_variance_matches_closed_form():
+    # Without binding bounds the minimum variance weights are inv(cov) 1 / (1' inv(cov) 1)
+    cov = np.array([[0.04, 0.01], [0.01, 0.09]])
+    expected = np.linalg.solve(cov, np.ones(2))
+
+    weights = opt.minimum_variance_weights(cov)
+
+    np.testing.assert_allclose(weights, expected / expected.sum(), atol=1e-6)
+
+
+def test_efficient_frontier_is_long_only_and_increasing():
+    returns, cov = random_problem()
+
+    weights = opt.efficient_frontier(returns, cov, points=20)
+
+    assert weights.shape == (20, 5)
+    assert np.all(weights >= 0)
+    np.testing.assert_allclose(weights.sum(axis=1), 1)
+    assert np.all(np.diff(weights @ returns) > 0)
+
+
+@pytest.fixture
+def failing_solver(monkeypatch):
+    """Make every solve with a target return fail, as SLSQP does when it can't converge"""
+    minimize = optimize.minimize
+
+    def solve(objective, x0, constraints, **kwargs):
+        result = minimize(objective, x0, constraints=constraints, **kwargs)
+        if len(constraints) > 1:
+            result.success = False
+            result.message = "Iteration limit reached"
+        return result
+
+    monkeypatch.setattr(optimize, "minimize", solve)
+
+
+@pytest.mark.usefixtures("failing_solver")
+def test_failed_solve_raises():
+    returns, cov = random_problem()
+
+    with pytest.raises(ValueError, match="Iteration limit reached"):
+        opt.minimum_variance_weights(cov, returns, target_return=returns.mean())
+
+
+@pytest.mark.usefixtures("failing_solver")
+def test_efficient_frontier_skips_failed_points():
+    returns, cov = random_problem()
+
+    with pytest.warns(RuntimeWarning, match="Skipping efficient frontier point"):
+        weights = opt.efficient_frontier(returns, cov, points=10)
+
+    # Only the unconstrained minimum variance portfolio was solved
+    np.testing.assert_allclose(weights, [opt.minimum_variance_weights(cov)])
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.utils.panel import ReturnsPanel
+
+
+def make_series(seed=0) -> dict[str, pd.Series]:
+    """Returns over partly overlapping business days with scattered missing days"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2020-01-01", periods=400)
+    series = {}
+    for i, code in enumerate(["A", "B", "C", "D"]):
+        index = dates[20 * i : 400 - 10 * i]
+        index = index[rng.random(len(index)) > 0.05]
+        series[code] = pd.Series(rng.standard_t(5, len(index)) * 0.01, index=index)
+    return series
+
+
+def test_pairwise_moments_match_dataframe():
+    series = make_series()
+    df = pd.DataFrame(series)
+
+    panel = ReturnsPanel(series)
+
+    np.testing.assert_allclose(panel.get_mean(), df.mean(), atol=1e-15)
+    np.testing.assert_allclose(panel.get_cov(), df.cov(), atol=1e-15)
+    np.testing.assert_allclose(panel.get_corr(), df.corr(), atol=1e-12)
+    np.testing.assert_allclose(panel.get_corr_cholesky(), np.linalg.cholesky(df.corr()), atol=1e-10)
+
+
+@pytest.mark.parametrize(
+    "missing, expected",
+    [("complete", lambda df: df.dropna()), ("zero", lambda df: df.fillna(0.0))],
+)
+def test_missing_policies_match_dataframe(missing, expected):
+    series = make_series()
+    df = expected(pd.DataFrame(series))
+
+    panel = ReturnsPanel(series, missing=missing)
+
+    np.testing.assert_allclose(panel.get_cov(), df.cov(), atol=1e-15)
+    np.testing.assert_allclose(panel.get_corr(), df.corr(), atol=1e-12)
+
+
+@pytest.mark.parametrize("missing", ["pairwise", "complete", "zero"])
+def test_add_and_remove_match_rebuild(missing):
+    series = make_series()
+    panel = ReturnsPanel({code: series[code] for code in "ABC"}, missing=missing)
+    panel.get_mean()
+    panel.get_corr_cholesky()
+
+    panel.add("D", series["D"])
+    panel.remove("B")
+
+    rebuilt = ReturnsPanel({code: series[code] for code in "ACD"}, missing=missing)
+    assert panel.codes == rebuilt.codes
+    np.testing.assert_array_equal(panel.dates, rebuilt.dates)
+    np.testing.assert_array_equal(panel.values, rebuilt.values)
+    np.testing.assert_allclose(panel.get_mean(), rebuilt.get_mean(), atol=1e-15)
+    np.testing.assert_allclose(panel.get_cov(), rebuilt.get_cov(), atol=1e-15)
+    np.testing.assert_allclose(panel.get_corr(), rebuilt.get_corr(), atol=1e-12)
+    np.testing.assert_allclose(panel.get_corr_cholesky(), rebuilt.get_corr_cholesky(), atol=1e-10)
+
+
+def test_copy_is_unaffected_by_edits():
+    series = make_series()
+    panel = ReturnsPanel({code: series[code] for code in "AB"})
+    corr = panel.get_corr().copy()
+
+    other = panel.copy()
+    other.add("C", series["C"])
+
+    assert panel.codes == ["A", "B"]
+    np.testing.assert_array_equal(panel.get_corr(), corr)
+
+
+def test_unknown_missing_policy():
+    with pytest.raises(ValueError):
+        ReturnsPanel({}, missing="drop")
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from lib.portfolio import Portfolio
+from lib.utils import cache
+
+
+def assert_same_portfolio(portfolio: Portfolio, expected: Portfolio):
+    assert portfolio.get_ticker_codes() == expected.get_ticker_codes()
+    assert portfolio.holdings == expected.holdings
+    np.testing.assert_allclose(portfolio.get_corr_matrix(), expected.get_corr_matrix(), atol=1e-12)
+    np.testing.assert_allclose(portfolio.get_cov_matrix(), expected.get_cov_matrix(), atol=1e-12)
+    np.testing.assert_allclose(portfolio.get_corr_cholesky(), expected.get_corr_cholesky(), atol=1e-10)
+    np.testing.assert_allclose(portfolio.annual_dists, expected.annual_dists, rtol=1e-6)
+
+
+@pytest.mark.usefixtures("provider")
+def test_add_and_remove_holdings_match_rebuild():
+    portfolio = Portfolio({"SYN000": 10, "SYN001": 20}, years=3, asx=False)
+    portfolio.get_corr_cholesky()
+
+    portfolio.add_holding("SYN002", 30)
+    assert_same_portfolio(
+        portfolio, Portfolio({"SYN000": 10, "SYN001": 20, "SYN002": 30}, years=3, asx=False)
+    )
+
+    portfolio.remove_holding("SYN001")
+    assert_same_portfolio(portfolio, Portfolio({"SYN000": 10, "SYN002": 30}, years=3, asx=False))
+
+
+@pytest.mark.usefixtures("provider")
+def test_copy_is_independent():
+    portfolio = Portfolio({"SYN000": 10, "SYN001": 20}, years=3, asx=False)
+    other = portfolio.copy()
+
+    other.add_holding("SYN002", 30)
+    other.set_units("SYN000", 5)
+
+    assert portfolio.get_ticker_codes() == ["SYN000", "SYN001"]
+    assert portfolio.holdings == {"SYN000": 10, "SYN001": 20}
+    assert portfolio.get_corr_cholesky().shape == (2, 2)
+
+
+@pytest.mark.usefixtures("provider")
+def test_construction_writes_fit_cache_in_batches(monkeypatch):
+    writes = []
+    monkeypatch.setattr(cache, "write_atomic", lambda path, write: writes.append(path))
+
+    Portfolio({f"SYN00{i}": 10 for i in range(4)}, years=3, asx=False)
+
+    # One write for the batched daily fits and one for the annual fits
+    assert len(writes) == 2
+
+
+@pytest.mark.usefixtures("provider")
+@pytest.mark.parametrize("sampling", ["random", "sobol"])
+def test_simulations_identical_across_executors(sampling):
+    portfolio = Portfolio({"SYN000": 10, "SYN001": 20, "SYN002": 30}, years=3, asx=False)
+
+    results = {
+        executor: portfolio.simulate_portfolio(
+            20, sims=500, seed=0, executor=executor, workers=3, sampling=sampling
+        )
+        for executor in ("serial", "thread", "process")
+    }
+    summaries = {
+        executor: portfolio.simulate_portfolio_summary(
+            20, sims=500, seed=0, executor=executor, workers=3, sampling=sampling
+        )
+        for executor in ("serial", "thread", "process")
+    }
+
+    for executor in ("thread", "process"):
+        np.testing.assert_array_equal(results[executor], results["serial"])
+        np.testing.assert_array_equal(summaries[executor]["terminal"], summaries["serial"]["terminal"])
+        np.testing.assert_array_equal(summaries[executor]["median"], summaries["serial"]["median"])
+        np.testing.assert_array_equal(summaries[executor]["mean"], summaries["serial"]["mean"])
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from lib.utils.quantiles import QuantileSketch
+
+
+Q = [0.0, 0.025, 0.25, 0.5, 0.75, 0.975, 1.0]
+
+
+def simulated_paths(sims: int, days: int, seed=0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    log_returns = rng.standard_t(4, (sims, days)) * 0.01
+    return 100 * np.exp(np.hstack([np.zeros((sims, 1)), np.cumsum(log_returns, axis=1)]))
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.001])
+def test_quantiles_within_relative_accuracy_of_nearest_rank(relative_accuracy):
+    paths = simulated_paths(2001, 100)
+
+    sketch = QuantileSketch(paths.shape[1], relative_accuracy=relative_accuracy)
+    sketch.update(paths)
+
+    expected = np.quantile(paths, Q, axis=0, method="lower")
+    assert np.all(np.abs(sketch.quantiles(Q) / expected - 1) <= relative_accuracy * (1 + 1e-9))
+
+
+def test_merged_blocks_match_single_update():
+    paths = simulated_paths(1000, 50)
+
+    single = QuantileSketch(paths.shape[1])
+    single.update(paths)
+
+    merged = QuantileSketch(paths.shape[1])
+    for block in np.array_split(paths, 7):
+        block_sketch = QuantileSketch(paths.shape[1])
+        block_sketch.update(block)
+        merged.merge(block_sketch)
+
+    assert merged.count == single.count
+    np.testing.assert_array_equal(merged.quantiles(Q), single.quantiles(Q))
+
+
+def test_update_grows_each_series_range():
+    sketch = QuantileSketch(2)
+    sketch.update(np.array([[1.0, 100.0]]))
+    sketch.update(np.array([[10.0, 0.1], [0.5, 1000.0]]))
+
+    expected = [[0.5, 0.1], [1, 100], [10, 1000]]
+    np.testing.assert_allclose(sketch.quantiles([0, 0.5, 1]), expected, rtol=sketch.relative_accuracy * 1.01)
+
+
+def test_percentiles_match_quantiles():
+    sketch = QuantileSketch(3)
+    sketch.update(simulated_paths(100, 2))
+
+    np.testing.assert_array_equal(sketch.percentiles([5, 50]), sketch.quantiles([0.05, 0.5]))
+
+
+def test_rejects_invalid_values():
+    sketch = QuantileSketch(2)
+    with pytest.raises(ValueError):
+        sketch.update(np.array([[1.0, 0.0]]))
+    with pytest.raises(ValueError):
+        sketch.update(np.ones((3, 4)))
+    with pytest.raises(ValueError):
+        sketch.quantiles(0.5)
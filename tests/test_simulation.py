@@ -0,0 +1,74 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.utils import simulation as sim
+
+
+def pandas_lag_correlations(series: pd.Series, max_lag: int) -> np.ndarray:
+    with warnings.catch_warnings():
+        # Pandas warns about the degrees of freedom of lags with too few overlapping values
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.array([series.corr(series.shift(lag)) for lag in range(max_lag + 1)])
+
+
+@pytest.mark.parametrize("n, max_lag", [(500, 60), (40, 30), (33, 100), (5, 10), (2, 3)])
+def test_lag_correlations_match_pandas(n, max_lag):
+    rng = np.random.default_rng(n)
+    series = pd.Series(rng.standard_t(4, n) * 0.01)
+
+    correlations = sim.calculate_lag_correlations(series, max_lag=max_lag)
+
+    assert list(correlations["Lag"]) == list(range(max_lag + 1))
+    np.testing.assert_allclose(
+        correlations["Directional"], pandas_lag_correlations(series, max_lag), atol=1e-9
+    )
+    np.testing.assert_allclose(
+        correlations["Non-Directional"], pandas_lag_correlations(series.abs(), max_lag), atol=1e-9
+    )
+
+
+def test_panel_lag_correlations_match_single_series():
+    rng = np.random.default_rng(0)
+    panel = pd.DataFrame(rng.standard_normal((300, 3)), columns=["A", "B", "C"])
+    panel.iloc[:50, 2] = np.nan
+
+    results = sim.calculate_panel_lag_correlations(panel, max_lag=20)
+
+    assert list(results) == ["A", "B", "C"]
+    for column in panel.columns:
+        expected = sim.calculate_lag_correlations(panel[column].dropna(), max_lag=20)
+        pd.testing.assert_frame_equal(results[column], expected, atol=1e-12)
+
+
+def random_corr_matrix(n: int, seed=0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    samples = rng.standard_normal((3 * n, n)) @ rng.standard_normal((n, n))
+    return np.corrcoef(samples, rowvar=False)
+
+
+def test_cholesky_append_matches_factorization():
+    corr = random_corr_matrix(6)
+    factor = np.linalg.cholesky(corr[:5, :5])
+
+    extended = sim.cholesky_append(factor, corr[5, :5])
+
+    np.testing.assert_allclose(extended, np.linalg.cholesky(corr), atol=1e-12)
+
+
+def test_cholesky_append_rejects_indefinite():
+    factor = np.linalg.cholesky(np.array([[1.0, 0.9], [0.9, 1.0]]))
+
+    assert sim.cholesky_append(factor, [0.9, -0.9]) is None
+
+
+@pytest.mark.parametrize("index", [0, 2, 5])
+def test_cholesky_delete_matches_factorization(index):
+    corr = random_corr_matrix(6)
+    reduced = np.delete(np.delete(corr, index, axis=0), index, axis=1)
+
+    factor = sim.cholesky_delete(np.linalg.cholesky(corr), index)
+
+    np.testing.assert_allclose(factor, np.linalg.cholesky(reduced), atol=1e-12)